@@ -0,0 +1,144 @@
+# checkout contention benchmark: a burst of desks issuing the same book at once.
+# runs the current single statement checkout and the previous read, check, write
+# checkout against scratch rows, then removes them
+import asyncio
+import time
+from datetime import date, timedelta
+
+from fastapi import HTTPException
+from sqlalchemy import delete, func, select
+
+from config.db import AsyncSessionLocal
+from controllers.bookIssueController import BookIssueController
+from models.models import Book, BookIssue, Student
+from schemas.bookIssue import BookIssueRequest
+
+BENCH_ISBN = "BENCH-CHECKOUT"
+BENCH_ROLL_PREFIX = "BENCH-CHECKOUT-"
+
+
+# the checkout as it was before the conditional decrement, kept only for comparison
+async def legacyIssueBook(db, issue_data: BookIssueRequest):
+    book = await db.scalar(select(Book).where(Book.id == issue_data.book_id))
+    student = await db.scalar(select(Student).where(Student.id == issue_data.student_id))
+    if not book or not student:
+        raise HTTPException(status_code=404, detail="book or student not found")
+    if book.number_of_copies <= 0:
+        raise HTTPException(status_code=400, detail="no available copies for this book")
+
+    existing = await db.scalar(
+        select(BookIssue).where(
+            BookIssue.book_id == issue_data.book_id,
+            BookIssue.student_id == issue_data.student_id,
+            BookIssue.return_date.is_(None),
+        )
+    )
+    if existing:
+        raise HTTPException(status_code=400, detail="Student already has this book issued")
+
+    db.add(
+        BookIssue(
+            book_id=issue_data.book_id,
+            student_id=issue_data.student_id,
+            issue_date=issue_data.issue_date,
+            due_date=issue_data.due_date,
+        )
+    )
+    book.number_of_copies -= 1
+    await db.commit()
+
+
+async def checkout(issue, book_id: int, student_id: int) -> str:
+    async with AsyncSessionLocal() as db:
+        try:
+            await issue(
+                db,
+                BookIssueRequest(
+                    book_id=book_id,
+                    student_id=student_id,
+                    issue_date=date.today(),
+                    due_date=date.today() + timedelta(days=14),
+                ),
+            )
+            return "issued"
+        except HTTPException:
+            return "rejected"
+        except Exception:
+            await db.rollback()
+            return "failed"
+
+
+async def setUp(requests: int, copies: int) -> tuple[int, list[int]]:
+    await tearDown()
+    async with AsyncSessionLocal() as db:
+        book = Book(
+            title="Checkout benchmark",
+            isbn=BENCH_ISBN,
+            number_of_copies=copies,
+            author="Benchmark",
+            category="Benchmark",
+        )
+        students = [
+            Student(
+                name=f"Benchmark {i}",
+                roll_number=f"{BENCH_ROLL_PREFIX}{i}",
+                department="Benchmark",
+                semester=1,
+                phone="0000000000",
+                email=f"bench-checkout-{i}@example.invalid",
+            )
+            for i in range(requests)
+        ]
+        db.add(book)
+        db.add_all(students)
+        await db.commit()
+        return book.id, [student.id for student in students]
+
+
+async def tearDown():
+    async with AsyncSessionLocal() as db:
+        book_ids = select(Book.id).where(Book.isbn == BENCH_ISBN).scalar_subquery()
+        await db.execute(delete(BookIssue).where(BookIssue.book_id.in_(book_ids)))
+        await db.execute(delete(Book).where(Book.isbn == BENCH_ISBN))
+        await db.execute(
+            delete(Student).where(Student.roll_number.startswith(BENCH_ROLL_PREFIX))
+        )
+        await db.commit()
+
+
+async def runVariant(name: str, issue, requests: int, copies: int) -> dict:
+    book_id, student_ids = await setUp(requests, copies)
+
+    started = time.perf_counter()
+    outcomes = await asyncio.gather(
+        *[checkout(issue, book_id, student_id) for student_id in student_ids]
+    )
+    elapsed = time.perf_counter() - started
+
+    async with AsyncSessionLocal() as db:
+        loans = await db.scalar(
+            select(func.count()).select_from(BookIssue).where(BookIssue.book_id == book_id)
+        )
+        copies_left = await db.scalar(
+            select(Book.number_of_copies).where(Book.id == book_id)
+        )
+    await tearDown()
+
+    return {
+        "variant": name,
+        "issued": outcomes.count("issued"),
+        "rejected": outcomes.count("rejected"),
+        "failed": outcomes.count("failed"),
+        "loans": loans,
+        "copies_left": copies_left,
+        "oversold": max(loans - copies, 0),
+        "seconds": round(elapsed, 3),
+        "checkouts_per_second": round(requests / elapsed, 1),
+    }
+
+
+async def runCheckoutBenchmark(requests: int = 100, copies: int = 10) -> list[dict]:
+    return [
+        await runVariant("legacy", legacyIssueBook, requests, copies),
+        await runVariant("atomic", BookIssueController.issueBook, requests, copies),
+    ]
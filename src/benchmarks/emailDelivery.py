@@ -0,0 +1,127 @@
+# email delivery benchmark: the previous one connection per message, one message at
+# a time sender against the pooled concurrent sender. both talk to a local stand-in
+# smtp server that delays every reply to simulate the round trip to a real provider
+import asyncio
+import smtplib
+import time
+
+from controllers.overdueTrackingController import EmailController
+from schemas.reminder import EmailConfig
+
+BENCH_HOST = "127.0.0.1"
+
+
+# just enough smtp for smtplib to deliver messages, which are counted and dropped
+class SinkSMTPServer:
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.messages = 0
+        self.sessions = 0
+        self.server = None
+        self.writers = set()
+
+    async def reply(self, writer: asyncio.StreamWriter, line: str):
+        await asyncio.sleep(self.latency)
+        writer.write(f"{line}\r\n".encode())
+        await writer.drain()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.sessions += 1
+        self.writers.add(writer)
+        await self.reply(writer, "220 sink ready")
+        try:
+            while line := await reader.readline():
+                command = line.decode(errors="replace").strip().upper()
+                if command.startswith(("EHLO", "HELO")):
+                    await self.reply(writer, "250 sink")
+                elif command == "DATA":
+                    await self.reply(writer, "354 end with <CRLF>.<CRLF>")
+                    while (await reader.readline()) not in (b".\r\n", b""):
+                        pass
+                    self.messages += 1
+                    await self.reply(writer, "250 queued")
+                elif command == "QUIT":
+                    await self.reply(writer, "221 bye")
+                    break
+                else:
+                    await self.reply(writer, "250 ok")
+        except ConnectionError:
+            pass
+        finally:
+            self.writers.discard(writer)
+            writer.close()
+
+    # end every open session the way a server does, optionally announcing it with 421
+    def drop(self, announce: bool = False):
+        for writer in self.writers:
+            if announce:
+                writer.write(b"421 closing idle session\r\n")
+            writer.close()
+
+    async def start(self) -> int:
+        self.server = await asyncio.start_server(self.handle, BENCH_HOST, 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+
+# the sender as it was before the pool, kept only for comparison
+async def legacySend(config: EmailConfig, message):
+    def _send_sync():
+        with smtplib.SMTP(config.smtp_server, config.smtp_port) as server:
+            server.send_message(message)
+
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, _send_sync)
+
+
+async def runEmailBenchmark(
+    messages: int = 500, connections: int = 8, latency_ms: float = 5
+) -> list[dict]:
+    sink = SinkSMTPServer(latency_ms / 1000)
+    port = await sink.start()
+    config = EmailConfig(
+        smtp_server=BENCH_HOST,
+        smtp_port=port,
+        sender_email="library@example.invalid",
+        use_tls=False,
+        max_connections=connections,
+    )
+    email_service = EmailController(config)
+    outbox = [
+        email_service.createMessage(
+            f"student{i}@example.invalid", "Benchmark", "<p>benchmark</p>"
+        )
+        for i in range(messages)
+    ]
+
+    try:
+        started = time.perf_counter()
+        for message in outbox:
+            await legacySend(config, message)
+        legacy_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        await asyncio.gather(*[email_service.pool.send(message) for message in outbox])
+        pooled_seconds = time.perf_counter() - started
+        pool_stats = email_service.pool.stats()
+    finally:
+        await email_service.close()
+        await sink.stop()
+
+    return [
+        {
+            "variant": "legacy",
+            "seconds": round(legacy_seconds, 3),
+            "messages_per_second": round(messages / legacy_seconds, 1),
+            "connections_opened": messages,
+        },
+        {
+            "variant": "pooled",
+            "seconds": round(pooled_seconds, 3),
+            "messages_per_second": round(messages / pooled_seconds, 1),
+            "connections_opened": pool_stats["connections_opened"],
+        },
+    ]
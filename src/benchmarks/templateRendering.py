@@ -0,0 +1,135 @@
+# reminder rendering benchmark: the previous inline f-string bodies against the
+# compiled template registry. no database or smtp server is involved, only rendering
+import time
+from collections import namedtuple
+from datetime import date, timedelta
+
+from controllers.overdueTrackingController import OverdueTrackingController
+from utils.reminderTemplates import ReminderTemplates
+
+Candidate = namedtuple(
+    "Candidate",
+    "id student_id due_date reminder_type student_name student_email book_title",
+)
+
+
+# the bodies as they were before the templates, kept only for comparison
+def legacyPreDue(student_name: str, book_title: str, due_date: date, days_remaining: int):
+    subject = f"Library Reminder: Book Due in {days_remaining} Days"
+
+    body = f"""
+        <html>
+        <body>
+            <h2>Library Book Reminder</h2>
+            <p>Dear {student_name},</p>
+
+            <p>This is a friendly reminder that you have a book due soon:</p>
+
+            <div style="background-color: #f0f8ff; padding: 15px; border-left: 4px solid #007bff;">
+                <strong>Book:</strong> {book_title}<br>
+                <strong>Due Date:</strong> {due_date.strftime('%B %d, %Y')}<br>
+                <strong>Days Remaining:</strong> {days_remaining}
+            </div>
+
+            <p>Please return the book on or before the due date to avoid late fees.</p>
+
+            <p>Thank you,<br>
+            University Library Team</p>
+        </body>
+        </html>
+        """
+
+    return subject, body
+
+
+def legacyOverdue(student_name: str, book_title: str, due_date: date, days_overdue: int):
+    subject = f"URGENT: Overdue Book - {days_overdue} Days Late"
+
+    body = f"""
+        <html>
+        <body>
+            <h2 style="color: #dc3545;">Overdue Book Notice</h2>
+            <p>Dear {student_name},</p>
+
+            <p><strong>Your book is now overdue. Please return it immediately.</strong></p>
+
+            <div style="background-color: #fff3cd; padding: 15px; border-left: 4px solid #ffc107;">
+                <strong>Book:</strong> {book_title}<br>
+                <strong>Due Date:</strong> {due_date.strftime('%B %d, %Y')}<br>
+                <strong>Days Overdue:</strong> {days_overdue}
+            </div>
+
+            <p>Please return the book to the library circulation desk as soon as possible.</p>
+
+            <p>University Library Team</p>
+        </body>
+        </html>
+        """
+
+    return subject, body
+
+
+def legacyRender(candidate: Candidate, today: date):
+    days_until_due = (candidate.due_date - today).days
+    if candidate.reminder_type == "pre_due":
+        return legacyPreDue(
+            candidate.student_name, candidate.book_title, candidate.due_date, days_until_due
+        )
+    return legacyOverdue(
+        candidate.student_name,
+        candidate.book_title,
+        candidate.due_date,
+        abs(days_until_due),
+    )
+
+
+def benchmarkCandidates(messages: int, today: date) -> list[Candidate]:
+    candidates = []
+    for i in range(messages):
+        due_date = today + timedelta(days=i % 30 - 20)
+        candidates.append(
+            Candidate(
+                id=i + 1,
+                student_id=i // 3 + 1,
+                due_date=due_date,
+                reminder_type="pre_due" if due_date >= today else "overdue",
+                student_name=f"Student {i // 3 + 1}",
+                student_email=f"student{i // 3 + 1}@example.invalid",
+                book_title=f"Title {i + 1}",
+            )
+        )
+    return candidates
+
+
+def runTemplateBenchmark(messages: int = 10000) -> tuple[float, list[dict]]:
+    today = date.today()
+    candidates = benchmarkCandidates(messages, today)
+
+    started = time.perf_counter()
+    templates = ReminderTemplates()
+    compile_ms = (time.perf_counter() - started) * 1000
+    tracking = OverdueTrackingController(None, None, templates=templates)
+    contexts = [tracking.reminder_context(candidate, today) for candidate in candidates]
+
+    def legacy():
+        for candidate in candidates:
+            legacyRender(candidate, today)
+
+    def template():
+        for name, context in contexts:
+            templates.render(name, context)
+
+    results = []
+    for variant, run in (("legacy", legacy), ("template", template)):
+        started = time.perf_counter()
+        run()
+        seconds = time.perf_counter() - started
+        results.append(
+            {
+                "variant": variant,
+                "seconds": round(seconds, 3),
+                "us_per_message": round(seconds / messages * 1_000_000, 1),
+                "messages_per_second": round(messages / seconds),
+            }
+        )
+    return round(compile_ms, 1), results
@@ -0,0 +1,137 @@
+from datetime import date, datetime
+from typing import List
+
+from sqlalchemy import Integer, any_, delete, func, insert, literal, select, text
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.models import (
+    BookIssue,
+    BookIssueArchive,
+    ReminderHistory,
+    ReminderHistoryArchive,
+)
+
+# academic years start on the 1st of july
+ACADEMIC_YEAR_START_MONTH = 7
+
+
+def academicYear(day: date) -> int:
+    return day.year if day.month >= ACADEMIC_YEAR_START_MONTH else day.year - 1
+
+
+def academicYearBounds(year: int) -> tuple[date, date]:
+    return (
+        date(year, ACADEMIC_YEAR_START_MONTH, 1),
+        date(year + 1, ACADEMIC_YEAR_START_MONTH, 1),
+    )
+
+
+# moves returned loans out of the operational BookIssues table into the partitioned
+# archive, so open loan scans and indexes only carry recent history
+class ArchiveController:
+    # one partition per academic year, created before rows for that year are moved in
+    @staticmethod
+    async def ensurePartitions(db: AsyncSession, first: date, last: date) -> List[str]:
+        try:
+            created = []
+            for year in range(academicYear(first), academicYear(last) + 1):
+                start, end = academicYearBounds(year)
+                name = f"{BookIssueArchive.__tablename__}_{year}"
+                await db.execute(
+                    text(
+                        f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF '
+                        f'"{BookIssueArchive.__tablename__}" '
+                        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+                    )
+                )
+                created.append(name)
+            await db.commit()
+            return created
+
+        except Exception as e:
+            await db.rollback()
+            raise Exception(f"Error creating archive partitions: {str(e)}")
+
+    # each batch locks its loans, moves their reminders and then the loans themselves,
+    # and commits, so the live tables are never locked for the whole run
+    @staticmethod
+    async def archiveReturnedLoans(
+        db: AsyncSession, returned_before: date, batch_size: int = 5000
+    ) -> tuple[int, int]:
+        try:
+            result = await db.execute(
+                select(func.min(BookIssue.issue_date), func.max(BookIssue.issue_date)).where(
+                    BookIssue.return_date < returned_before
+                )
+            )
+            first, last = result.one()
+            if first is None:
+                return 0, 0
+            await ArchiveController.ensurePartitions(db, first, last)
+
+            loans_moved, reminders_moved = 0, 0
+            while True:
+                result = await db.execute(
+                    select(BookIssue.id)
+                    .where(BookIssue.return_date < returned_before)
+                    .order_by(BookIssue.id)
+                    .limit(batch_size)
+                    .with_for_update(skip_locked=True)
+                )
+                ids = result.scalars().all()
+                if not ids:
+                    break
+                batch = literal(ids, ARRAY(Integer))
+
+                # the archive keeps the reminder, not the email that carried it
+                reminder_columns = [
+                    c.name
+                    for c in ReminderHistory.__table__.c
+                    if c.name in ReminderHistoryArchive.__table__.c
+                ]
+                moved_reminders = (
+                    delete(ReminderHistory)
+                    .where(ReminderHistory.book_issue_id == any_(batch))
+                    .returning(*ReminderHistory.__table__.c)
+                    .cte("moved_reminders")
+                )
+                result = await db.execute(
+                    insert(ReminderHistoryArchive)
+                    .from_select(
+                        reminder_columns,
+                        select(*[moved_reminders.c[name] for name in reminder_columns]),
+                    )
+                )
+                reminders_moved += result.rowcount
+
+                # the archive keeps the loan itself, not its reminder schedule
+                loan_columns = [
+                    c.name
+                    for c in BookIssue.__table__.c
+                    if c.name in BookIssueArchive.__table__.c
+                ]
+                moved_loans = (
+                    delete(BookIssue)
+                    .where(BookIssue.id == any_(batch))
+                    .returning(*BookIssue.__table__.c)
+                    .cte("moved_loans")
+                )
+                result = await db.execute(
+                    insert(BookIssueArchive).from_select(
+                        loan_columns + ["archived_at"],
+                        select(
+                            *[moved_loans.c[name] for name in loan_columns],
+                            literal(datetime.now()),
+                        ),
+                    )
+                )
+                loans_moved += result.rowcount
+
+                await db.commit()
+
+            return loans_moved, reminders_moved
+
+        except Exception as e:
+            await db.rollback()
+            raise Exception(f"Error archiving returned loans: {str(e)}")
@@ -1,32 +1,130 @@
-from sqlalchemy import delete, select, update
+from datetime import datetime
+from functools import reduce
+from sqlalchemy import (
+    Integer,
+    Select,
+    String,
+    any_,
+    column,
+    delete,
+    func,
+    insert,
+    literal,
+    literal_column,
+    or_,
+    select,
+    table,
+    text,
+    tuple_,
+    update,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from schemas.book import BookCreate, BookUpdate
-from models.models import Book
-from typing import List, Optional
+from models.models import Book, BookFacetCount, SEARCH_CONFIG, bookSearchVector
+from typing import AsyncIterator, List, Optional
+from utils.bulkImport import ImportReport, formatRowErrors
+from utils.entityCache import bookCache
+from utils.pagination import decodeCursor, encodeCursor, estimateCount
+
+BOOK_STAGING_TABLE = table(
+    "BooksImportStaging",
+    column("title"),
+    column("isbn"),
+    column("number_of_copies"),
+    column("author"),
+    column("category"),
+)
 
 
 # Boook controller
 # all function names are descriptive of what they do
 class BookController:
+    # served from the entity cache when possible. pass cached=False when the caller is
+    # going to write the book, database reads always refresh the session's copy
     @staticmethod
-    async def getBookById(db: AsyncSession, book_id: int) -> Optional[Book]:
+    async def getBookById(
+        db: AsyncSession, book_id: int, cached: bool = True
+    ) -> Optional[Book]:
         try:
-            result = await db.execute(select(Book).where(Book.id == book_id))
-            return result.scalar_one_or_none()
+            if cached:
+                book = await bookCache.get(db, book_id)
+                if book is not None:
+                    return book
+
+            result = await db.execute(
+                select(Book)
+                .where(Book.id == book_id)
+                .execution_options(populate_existing=True)
+            )
+            book = result.scalar_one_or_none()
+            if book is not None:
+                bookCache.put(book)
+            return book
         except Exception as e:
             raise Exception(f"Error fetching book: {str(e)}")
 
+    # resolves ids and isbns with one query, returning lookups keyed by id and by isbn
+    @staticmethod
+    async def getBooksByIdsOrIsbns(
+        db: AsyncSession, ids: List[int], isbns: List[str]
+    ) -> tuple[dict, dict]:
+        try:
+            conditions = []
+            if ids:
+                conditions.append(Book.id == any_(literal(ids, ARRAY(Integer))))
+            if isbns:
+                conditions.append(Book.isbn == any_(literal(isbns, ARRAY(String))))
+
+            result = await db.execute(select(Book).where(or_(*conditions)))
+            books = result.scalars().all()
+
+            for book in books:
+                bookCache.put(book)
+            return {book.id: book for book in books}, {book.isbn: book for book in books}
+        except Exception as e:
+            raise Exception(f"Error fetching books: {str(e)}")
+
+    # cheap freshness probe for conditional requests: (exists, updated_at). updated_at
+    # can be NULL for a book that exists, so existence is reported separately
+    @staticmethod
+    async def getBookVersion(
+        db: AsyncSession, book_id: int
+    ) -> tuple[bool, Optional[datetime]]:
+        try:
+            result = await db.execute(
+                select(Book.updated_at).where(Book.id == book_id)
+            )
+            row = result.one_or_none()
+            if row is None:
+                return False, None
+            return True, row.updated_at
+        except Exception as e:
+            raise Exception(f"Error fetching book: {str(e)}")
+
+    # rows changed since updated_since, oldest change first so a sync can resume from the last row
+    @staticmethod
+    def exportQuery(updated_since: Optional[datetime] = None):
+        query = select(Book.__table__)
+        if updated_since:
+            query = query.where(Book.updated_at >= updated_since)
+        return query.order_by(Book.updated_at, Book.id)
+
     @staticmethod
     async def createBook(db: AsyncSession, book_data: BookCreate) -> Book:
         try:
-            new_book = Book(
-                title=book_data.title,
-                isbn=book_data.isbn,
-                number_of_copies=book_data.number_of_copies,
-                author=book_data.author,
-                category=book_data.category,
+            result = await db.execute(
+                insert(Book)
+                .values(
+                    title=book_data.title,
+                    isbn=book_data.isbn,
+                    number_of_copies=book_data.number_of_copies,
+                    author=book_data.author,
+                    category=book_data.category,
+                )
+                .returning(Book)
             )
-            db.add(new_book)
+            new_book = result.scalar_one()
             await db.commit()
             return new_book
 
@@ -34,29 +132,140 @@ class BookController:
             await db.rollback()
             raise Exception(f"Error Creating book: {str(e)}")
 
+    # streams validated batches into a temp staging table with COPY, then merges them into
+    # Books in one statement per batch. an existing isbn gets the new copies added to it
+    @staticmethod
+    async def bulkImportBooks(
+        db: AsyncSession, batches: AsyncIterator[tuple[list, list, Optional[str]]]
+    ) -> ImportReport:
+        report = ImportReport()
+
+        async for valid_rows, row_errors, file_error in batches:
+            report.rows_received += len(valid_rows) + len(row_errors)
+            report.reject(row_errors)
+            report.file_error = file_error
+
+            records, record_rows = [], []
+            for row_number, book in valid_rows:
+                if len(book.isbn) > Book.isbn.type.length:
+                    message = f"ISBN cannot exceed {Book.isbn.type.length} characters"
+                    report.reject(
+                        [
+                            {
+                                "row": row_number,
+                                "errors": [{"field": "isbn", "message": message}],
+                            }
+                        ]
+                    )
+                    continue
+                records.append(
+                    (
+                        book.title,
+                        book.isbn,
+                        book.number_of_copies,
+                        book.author,
+                        book.category,
+                    )
+                )
+                record_rows.append(row_number)
+            if not records:
+                continue
+
+            try:
+                created, updated_ids = await BookController.mergeBookBatch(db, records)
+                await db.commit()
+                bookCache.invalidate(*updated_ids)
+                report.rows_imported += len(records)
+                report.created += created
+                report.updated += len(updated_ids)
+            except Exception as e:
+                await db.rollback()
+                report.reject(
+                    [
+                        formatRowErrors(row_number, Exception(f"Batch failed: {str(e)}"))
+                        for row_number in record_rows
+                    ]
+                )
+
+        return report
+
+    @staticmethod
+    async def mergeBookBatch(
+        db: AsyncSession, records: List[tuple]
+    ) -> tuple[int, List[int]]:
+        await db.execute(
+            text(
+                f'CREATE TEMP TABLE "{BOOK_STAGING_TABLE.name}" '
+                "(title varchar(256), isbn varchar(14), number_of_copies integer, "
+                "author varchar(256), category varchar(256)) ON COMMIT DROP"
+            )
+        )
+
+        conn = await db.connection()
+        raw_connection = await conn.get_raw_connection()
+        await raw_connection.driver_connection.copy_records_to_table(
+            BOOK_STAGING_TABLE.name,
+            records=records,
+            columns=[field.name for field in BOOK_STAGING_TABLE.columns],
+        )
+
+        # rows repeating an isbn within the batch are folded into one before the upsert
+        now = datetime.now()
+        staged = BOOK_STAGING_TABLE.c
+        merge = pg_insert(Book).from_select(
+            ["title", "isbn", "number_of_copies", "author", "category", "created_at", "updated_at"],
+            select(
+                func.min(staged.title),
+                staged.isbn,
+                func.sum(staged.number_of_copies),
+                func.min(staged.author),
+                func.min(staged.category),
+                literal(now),
+                literal(now),
+            ).group_by(staged.isbn),
+        )
+        merge = merge.on_conflict_do_update(
+            index_elements=[Book.isbn],
+            set_={
+                "number_of_copies": Book.number_of_copies
+                + merge.excluded.number_of_copies,
+                "updated_at": merge.excluded.updated_at,
+            },
+        ).returning(Book.id, literal_column("xmax = 0"))
+
+        result = await db.execute(merge)
+        merged = result.all()
+        updated_ids = [book_id for book_id, was_inserted in merged if not was_inserted]
+        return len(merged) - len(updated_ids), updated_ids
+
+    # every write below is a single UPDATE/DELETE ... RETURNING statement
     @staticmethod
     async def updateBook(
         db: AsyncSession, book_id: int, book_update: BookUpdate
     ) -> Optional[Book]:
         try:
-            existing_book = await BookController.getBookById(db, book_id)
-            if not existing_book:
-                return None
-
             update_data = {
                 nonNullFields: field
                 for nonNullFields, field in book_update.dict().items()
                 if field is not None
             }
             if not update_data:
-                return existing_book
+                return await BookController.getBookById(db, book_id)
 
-            await db.execute(
-                update(Book).where(Book.id == book_id).values(**update_data)
+            result = await db.execute(
+                update(Book)
+                .where(Book.id == book_id)
+                .values(**update_data)
+                .returning(Book)
+                .execution_options(populate_existing=True)
             )
+            updated_book = result.scalar_one_or_none()
             await db.commit()
 
-            return await BookController.getBookById(db, book_id)
+            bookCache.invalidate(book_id)
+            if updated_book is not None:
+                bookCache.put(updated_book)
+            return updated_book
         except Exception as e:
             await db.rollback()
             raise Exception(f"Error Updating Book: {str(e)}")
@@ -64,62 +273,242 @@ class BookController:
     @staticmethod
     async def deleteBook(db: AsyncSession, book_id: int) -> bool:
         try:
-            existing_book = await BookController.getBookById(db, book_id)
-            if not existing_book:
-                return False
-
-            await db.execute(delete(Book).where(Book.id == book_id))
+            result = await db.execute(
+                delete(Book).where(Book.id == book_id).returning(Book.id)
+            )
+            deleted_id = result.scalar_one_or_none()
             await db.commit()
 
-            return True
+            bookCache.invalidate(book_id)
+            return deleted_id is not None
         except Exception as e:
             await db.rollback()
             raise Exception(f"Error Updating Book: {str(e)}")
 
+    # fuzzy matching adds trigram word similarity (typo tolerant) next to the substring match
     @staticmethod
-    async def searchBooks(
+    def buildFieldFilter(field, term: str, fuzzy: bool = False):
+        if fuzzy:
+            return or_(field.ilike(f"%{term}%"), field.op("%>")(term))
+        return field.ilike(f"%{term}%")
+
+    # builds the where clauses shared by every search mode
+    @staticmethod
+    def buildSearchFilters(
+        title: Optional[str] = None,
+        author: Optional[str] = None,
+        category: Optional[str] = None,
+        isbn: Optional[str] = None,
+        q: Optional[str] = None,
+        fuzzy: bool = False,
+    ) -> list:
+        filters = []
+        for field, term in (
+            (Book.title, title),
+            (Book.author, author),
+            (Book.category, category),
+        ):
+            if term:
+                filters.append(BookController.buildFieldFilter(field, term, fuzzy))
+
+        if isbn:
+            filters.append(Book.isbn == isbn)
+
+        if q:
+            filters.append(
+                or_(
+                    bookSearchVector().op("@@")(
+                        func.websearch_to_tsquery(SEARCH_CONFIG, q)
+                    ),
+                    Book.title.op("%>")(q),
+                    Book.author.op("%>")(q),
+                )
+            )
+
+        return filters
+
+    # relevance = full text rank of q + trigram word similarity of every field term
+    @staticmethod
+    def buildRelevanceScore(
+        title: Optional[str] = None,
+        author: Optional[str] = None,
+        category: Optional[str] = None,
+        q: Optional[str] = None,
+    ):
+        scores = []
+        for field, term in (
+            (Book.title, title),
+            (Book.author, author),
+            (Book.category, category),
+        ):
+            if term:
+                scores.append(func.word_similarity(term, field))
+
+        if q:
+            scores.append(
+                func.ts_rank_cd(
+                    bookSearchVector(), func.websearch_to_tsquery(SEARCH_CONFIG, q)
+                )
+            )
+            scores.append(
+                func.greatest(
+                    func.word_similarity(q, Book.title),
+                    func.word_similarity(q, Book.author),
+                )
+            )
+
+        if not scores:
+            return None
+        return reduce(lambda total, score: total + score, scores)
+
+    # category and author counts under the search filters. author/category filters are
+    # answered from the BookFacetCounts summary, other filters need the matching books grouped
+    @staticmethod
+    async def getSearchFacets(
         db: AsyncSession,
         title: Optional[str] = None,
         author: Optional[str] = None,
         category: Optional[str] = None,
         isbn: Optional[str] = None,
-        page: int = 1,
-        limit: int = 10,
-    ) -> tuple[List[Book], int]:
+        q: Optional[str] = None,
+        sort: str = "title",
+        facet_limit: int = 20,
+    ) -> dict:
         try:
-            query = select(Book)
-            count_query = select(Book)
+            fuzzy = sort == "relevance"
+            if title or isbn or q:
+                filters = BookController.buildSearchFilters(
+                    title=title,
+                    author=author,
+                    category=category,
+                    isbn=isbn,
+                    q=q,
+                    fuzzy=fuzzy,
+                )
+                columns = {"category": Book.category, "author": Book.author}
+                count = func.count()
+            else:
+                filters = [
+                    BookController.buildFieldFilter(field, term, fuzzy)
+                    for field, term in (
+                        (BookFacetCount.author, author),
+                        (BookFacetCount.category, category),
+                    )
+                    if term
+                ]
+                columns = {
+                    "category": BookFacetCount.category,
+                    "author": BookFacetCount.author,
+                }
+                count = func.sum(BookFacetCount.book_count)
+
+            facets = {}
+            for name, field in columns.items():
+                result = await db.execute(
+                    select(field, count)
+                    .where(*filters)
+                    .group_by(field)
+                    .order_by(count.desc(), field)
+                    .limit(facet_limit)
+                )
+                facets[name] = [
+                    {"value": value, "count": int(total)} for value, total in result
+                ]
+            return facets
+
+        except Exception as e:
+            raise Exception(f"Error computing search facets: {str(e)}")
 
-            if title:
-                title_filter = Book.title.ilike(f"%{title}%")
-                query = query.where(title_filter)
-                count_query = count_query.where(title_filter)
+    @staticmethod
+    async def countBooks(db: AsyncSession, filters: list, estimate: bool = False) -> int:
+        if estimate:
+            return await estimateCount(db, select(Book.id).where(*filters))
+
+        result = await db.execute(select(func.count()).select_from(Book).where(*filters))
+        return result.scalar_one()
+
+    # page mode uses OFFSET, cursor mode (after) seeks past the (title, id) of the last row seen.
+    # fetches one extra row, which tells us whether there is a next page without counting
+    @staticmethod
+    def searchQuery(
+        filters: list,
+        score=None,
+        page: int = 1,
+        limit: int = 10,
+        after: Optional[str] = None,
+    ) -> Select:
+        query = select(Book).where(*filters)
+        if score is not None:
+            if after:
+                raise ValueError(
+                    "Cursor pagination is only supported when sorting by title"
+                )
+            query = query.order_by(score.desc(), Book.id)
+        else:
+            query = query.order_by(Book.title, Book.id)
 
-            if author:
-                author_filter = Book.author.ilike(f"%{author}%")
-                query = query.where(author_filter)
-                count_query = count_query.where(author_filter)
+        if after:
+            last_title, last_id = decodeCursor(after, str, int)
+            query = query.where(tuple_(Book.title, Book.id) > (last_title, last_id))
+        else:
+            query = query.offset((page - 1) * limit)
 
-            if category:
-                category_filter = Book.category.ilike(f"%{category}%")
-                query = query.where(category_filter)
-                count_query = count_query.where(category_filter)
+        return query.limit(limit + 1)
 
-            if isbn:
-                isbn_filter = Book.isbn == isbn
-                query = query.where(isbn_filter)
-                count_query = count_query.where(isbn_filter)
+    # count is "exact", "estimate" (planner estimate) or "none"
+    @staticmethod
+    async def searchBooks(
+        db: AsyncSession,
+        title: Optional[str] = None,
+        author: Optional[str] = None,
+        category: Optional[str] = None,
+        isbn: Optional[str] = None,
+        q: Optional[str] = None,
+        sort: str = "title",
+        page: int = 1,
+        limit: int = 10,
+        after: Optional[str] = None,
+        count: str = "exact",
+    ) -> tuple[List[Book], Optional[int], bool, Optional[str]]:
+        try:
+            filters = BookController.buildSearchFilters(
+                title=title,
+                author=author,
+                category=category,
+                isbn=isbn,
+                q=q,
+                fuzzy=sort == "relevance",
+            )
 
-            count_result = await db.execute(count_query)
-            total_count = len(count_result.scalars().all())
+            total_count = None
+            if count != "none":
+                total_count = await BookController.countBooks(
+                    db, filters, estimate=count == "estimate"
+                )
 
-            offset = (page - 1) * limit
-            query = query.offset(offset).limit(limit).order_by(Book.title, Book.id)
+            score = None
+            if sort == "relevance":
+                score = BookController.buildRelevanceScore(
+                    title=title, author=author, category=category, q=q
+                )
 
-            result = await db.execute(query)
+            result = await db.execute(
+                BookController.searchQuery(
+                    filters, score=score, page=page, limit=limit, after=after
+                )
+            )
             books = result.scalars().all()
 
-            return books, total_count
+            has_next = len(books) > limit
+            books = books[:limit]
+
+            next_cursor = None
+            if has_next and score is None:
+                next_cursor = encodeCursor([books[-1].title, books[-1].id])
+
+            return books, total_count, has_next, next_cursor
 
+        except ValueError:
+            raise
         except Exception as e:
             raise Exception(f"Error searching books: {str(e)}")
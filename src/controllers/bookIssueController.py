@@ -1,96 +1,167 @@
+import json
 from fastapi import HTTPException
-from sqlalchemy import select, update
+from sqlalchemy import (
+    Integer,
+    Select,
+    Table,
+    and_,
+    any_,
+    exists,
+    func,
+    insert,
+    literal,
+    select,
+    tuple_,
+    union_all,
+    update,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, aggregate_order_by
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List, Optional
-from datetime import date
+from typing import AsyncGenerator, List, Optional
+from datetime import date, datetime
 
 from schemas.bookIssue import (
+    BatchItemResult,
+    BookIssueBatchRequest,
     BookIssueRequest,
+    BookReturnBatchRequest,
     BookReturnRequest,
     BookIssueResponse,
     IssueReportResponse,
     IssuedBooksResponse,
+    LoanHistoryResponse,
 )
 from schemas.book import BookRead
 from schemas.student import StudentRead
-from models.models import BookIssue, Book, Student
-from controllers.bookController import BookController
+from models.models import BookIssue, BookIssueArchive, Book, Student
 from controllers.studentController import StudentController
+from utils.entityCache import bookCache
+from config.db import AsyncSessionLocal
+from utils.pagination import decodeCursor, encodeCursor
+from utils.reminderSchedule import firstReminderOn
+from utils.streaming import EXPORT_CHUNK_SIZE
+
+FOREIGN_KEY_VIOLATION = "23503"
 
 
 # Boook issue controller
 # all functions are self desciptive using their name
 class BookIssueController:
+    @staticmethod
+    def exportQuery(updated_since: Optional[datetime] = None):
+        query = select(BookIssue.__table__)
+        if updated_since:
+            query = query.where(BookIssue.updated_at >= updated_since)
+        return query.order_by(BookIssue.updated_at, BookIssue.id)
+
+    # checkout is one statement: the copy is taken by a conditional decrement in a cte
+    # and the loan inserted from its returning row, so concurrent desks cannot oversell
+    # and the partial unique index rejects a second open loan of the same book
     @staticmethod
     async def issueBook(db: AsyncSession, issue_data: BookIssueRequest) -> BookIssue:
         try:
-            result = await db.execute(select(Book).where(Book.id == issue_data.book_id))
-            book = result.scalar_one_or_none()
-            result = await db.execute(
-                select(Student).where(Student.id == issue_data.student_id)
-            )
-            student = result.scalar_one_or_none()
-            print(f"\n{book}, {student}\n")
-            if not book or not student:
-                raise HTTPException(status_code=404, detail="book or student not found")
-
-            if book.number_of_copies <= 0:
-                raise HTTPException(
-                    status_code=400, detail="no available copies for this book"
+            now = datetime.now()
+            decremented = (
+                update(Book)
+                .where(
+                    Book.id == issue_data.book_id,
+                    Book.number_of_copies > 0,
                 )
-
+                .values(number_of_copies=Book.number_of_copies - 1, updated_at=now)
+                .returning(Book.id)
+                .cte("decremented")
+            )
             result = await db.execute(
-                select(BookIssue).where(
-                    BookIssue.book_id == issue_data.book_id,
-                    BookIssue.student_id == issue_data.student_id,
-                    BookIssue.return_date.is_(None),
+                insert(BookIssue)
+                .from_select(
+                    [
+                        "book_id",
+                        "student_id",
+                        "issue_date",
+                        "due_date",
+                        "next_reminder_on",
+                        "created_at",
+                        "updated_at",
+                    ],
+                    select(
+                        decremented.c.id,
+                        literal(issue_data.student_id),
+                        literal(issue_data.issue_date),
+                        literal(issue_data.due_date),
+                        literal(firstReminderOn(issue_data.due_date)),
+                        literal(now),
+                        literal(now),
+                    ),
                 )
+                .returning(BookIssue)
             )
-            existing_issues = result.scalar_one_or_none()
-            if existing_issues:
+            new_book_issue = result.scalar_one_or_none()
+
+            if new_book_issue is None:
+                # nothing was decremented, find out whether the book exists at all
+                await db.rollback()
+                book_id = await db.scalar(
+                    select(Book.id).where(Book.id == issue_data.book_id)
+                )
+                if book_id is None:
+                    raise HTTPException(status_code=404, detail="book or student not found")
                 raise HTTPException(
-                    status_code=400, detail="Student already has this book issued"
+                    status_code=400, detail="no available copies for this book"
                 )
 
-            # all checks complete, can now issue book
-            new_book_issue = BookIssue(
-                book_id=issue_data.book_id,
-                student_id=issue_data.student_id,
-                issue_date=issue_data.issue_date,
-                due_date=issue_data.due_date,
-            )
-            book.number_of_copies -= 1
-            db.add(new_book_issue)
             await db.commit()
+            bookCache.invalidate(issue_data.book_id)
 
             return new_book_issue
 
         except HTTPException:
             raise
+        except IntegrityError as e:
+            await db.rollback()
+            if getattr(e.orig, "sqlstate", None) == FOREIGN_KEY_VIOLATION:
+                raise HTTPException(status_code=404, detail="book or student not found")
+            raise HTTPException(
+                status_code=400, detail="Student already has this book issued"
+            )
         except Exception as e:
             await db.rollback()
             raise Exception(f"Error Creating book: {str(e)}")
 
+    # return is one statement as well: the loan is closed only if still open and the
+    # copy is put back from the closed loan's book id
     @staticmethod
     async def returnBook(db: AsyncSession, return_data: BookReturnRequest) -> bool:
         try:
-            result = await db.execute(
-                select(BookIssue).where(
+            returned = (
+                update(BookIssue)
+                .where(
                     BookIssue.id == return_data.issue_id,
                     BookIssue.return_date.is_(None),
                 )
+                .values(return_date=return_data.return_date, updated_at=datetime.now())
+                .returning(BookIssue.book_id)
+                .cte("returned")
             )
-            existing_issue = result.scalar_one_or_none()
-            if not existing_issue:
+            result = await db.execute(
+                update(Book)
+                .where(Book.id == returned.c.book_id)
+                .values(
+                    number_of_copies=Book.number_of_copies + 1,
+                    updated_at=datetime.now(),
+                )
+                .returning(Book.id)
+                .execution_options(synchronize_session=False)
+            )
+            book_id = result.scalar_one_or_none()
+            if book_id is None:
+                await db.rollback()
                 raise HTTPException(
                     status_code=404, detail="book issue not found or already returned"
                 )
 
-            existing_issue.return_date = return_data.return_date
-            book = await BookController.getBookById(db, existing_issue.book_id)
-            book.number_of_copies += 1
-
             await db.commit()
+            bookCache.invalidate(book_id)
             return True
 
         except HTTPException:
@@ -99,79 +170,566 @@ class BookIssueController:
             await db.rollback()
             raise Exception(f"Error Creating book: {str(e)}")
 
+    # a desk basket in one transaction: every requested copy is taken by one set based
+    # decrement (skipping books the student already holds) feeding one multi row insert.
+    # books that were not issued are classified with one more query
     @staticmethod
-    async def getBooksIssuedToStudent(
-        db: AsyncSession, student_id: int
-    ) -> List[IssuedBooksResponse]:
+    async def issueBooks(
+        db: AsyncSession, batch: BookIssueBatchRequest
+    ) -> List[BatchItemResult]:
         try:
-            student = await StudentController.getStudentById(db, student_id)
+            student = await StudentController.getStudentById(db, batch.student_id)
             if not student:
                 raise HTTPException(status_code=404, detail="student not found")
 
+            book_ids = list(dict.fromkeys(batch.book_ids))
+            now = datetime.now()
+            open_loan = exists().where(
+                BookIssue.book_id == Book.id,
+                BookIssue.student_id == batch.student_id,
+                BookIssue.return_date.is_(None),
+            )
+            decremented = (
+                update(Book)
+                .where(
+                    Book.id == any_(literal(book_ids, ARRAY(Integer))),
+                    Book.number_of_copies > 0,
+                    ~open_loan,
+                )
+                .values(number_of_copies=Book.number_of_copies - 1, updated_at=now)
+                .returning(Book.id)
+                .cte("decremented")
+            )
             result = await db.execute(
-                select(BookIssue).where(
-                    BookIssue.student_id == student_id,
-                    BookIssue.return_date.is_(None),
+                insert(BookIssue)
+                .from_select(
+                    [
+                        "book_id",
+                        "student_id",
+                        "issue_date",
+                        "due_date",
+                        "next_reminder_on",
+                        "created_at",
+                        "updated_at",
+                    ],
+                    select(
+                        decremented.c.id,
+                        literal(batch.student_id),
+                        literal(batch.issue_date),
+                        literal(batch.due_date),
+                        literal(firstReminderOn(batch.due_date)),
+                        literal(now),
+                        literal(now),
+                    ),
                 )
+                .returning(BookIssue.book_id, BookIssue.id)
             )
-            book_issue_records = result.scalars().all()
-            print(book_issue_records)
+            issued = dict(result.all())
 
-            books_issued = []
-            for book_issue in book_issue_records:
-                book = await BookController.getBookById(db, book_issue.book_id)
-                if not book:
-                    continue
-                is_overdue = date.today() > book_issue.due_date
-                books_issued.append(
-                    IssuedBooksResponse(
-                        book=BookRead.model_validate(book),
-                        is_overdue=is_overdue,
+            failed = [book_id for book_id in book_ids if book_id not in issued]
+            reasons = {}
+            if failed:
+                result = await db.execute(
+                    select(Book.id, open_loan.label("already_issued")).where(
+                        Book.id == any_(literal(failed, ARRAY(Integer)))
                     )
                 )
+                reasons = {
+                    book_id: (
+                        "Student already has this book issued"
+                        if already_issued
+                        else "no available copies for this book"
+                    )
+                    for book_id, already_issued in result.all()
+                }
 
-            return books_issued
+            await db.commit()
+            bookCache.invalidate(*issued)
+
+            results, seen = [], set()
+            for book_id in batch.book_ids:
+                if book_id in seen:
+                    results.append(
+                        BatchItemResult(
+                            book_id=book_id, status="failed", detail="duplicate in request"
+                        )
+                    )
+                elif book_id in issued:
+                    results.append(
+                        BatchItemResult(
+                            book_id=book_id, issue_id=issued[book_id], status="issued"
+                        )
+                    )
+                else:
+                    results.append(
+                        BatchItemResult(
+                            book_id=book_id,
+                            status="failed",
+                            detail=reasons.get(book_id, "book not found"),
+                        )
+                    )
+                seen.add(book_id)
+            return results
 
         except HTTPException:
             raise
+        except IntegrityError as e:
+            await db.rollback()
+            if getattr(e.orig, "sqlstate", None) == FOREIGN_KEY_VIOLATION:
+                raise HTTPException(status_code=404, detail="student not found")
+            raise HTTPException(
+                status_code=409,
+                detail="a concurrent checkout issued one of these books, retry the basket",
+            )
         except Exception as e:
             await db.rollback()
-            raise Exception(f"Error fetching books issued to student: {str(e)}")
+            raise Exception(f"Error issuing books: {str(e)}")
 
-    # create book issue report with all issued books, their overdue, return status
+    # closes every open loan of the basket and puts the copies back, counted per book,
+    # in a single statement; loans that were not closed are classified afterwards
     @staticmethod
-    async def getBookIssueReport(
-        db: AsyncSession,
-    ) -> List[IssueReportResponse]:
+    async def returnBooks(
+        db: AsyncSession, batch: BookReturnBatchRequest
+    ) -> List[BatchItemResult]:
         try:
-            result = await db.execute(select(BookIssue))
-            books_issued = result.scalars().all()
-
-            issue_report = []
-            for issue in books_issued:
-                student = await StudentController.getStudentById(db, issue.student_id)
-                if not student:
-                    raise HTTPException(status_code=404, detail="student not found")
-                book = await BookController.getBookById(db, issue.book_id)
-                if not book:
-                    raise HTTPException(status_code=404, detail="student not found")
-
-                is_overdue = date.today() > issue.due_date
-                is_returned = issue.return_date is not None
-
-                issue_report.append(
-                    IssueReportResponse(
-                        book=BookRead.model_validate(book),
-                        student=StudentRead.model_validate(student),
-                        is_overdue=is_overdue,
-                        is_returned=is_returned,
+            issue_ids = list(dict.fromkeys(batch.issue_ids))
+            now = datetime.now()
+            returned = (
+                update(BookIssue)
+                .where(
+                    BookIssue.id == any_(literal(issue_ids, ARRAY(Integer))),
+                    BookIssue.return_date.is_(None),
+                )
+                .values(return_date=batch.return_date, updated_at=now)
+                .returning(BookIssue.id, BookIssue.book_id)
+                .cte("returned")
+            )
+            copies = (
+                select(returned.c.book_id, func.count().label("copies"))
+                .group_by(returned.c.book_id)
+                .subquery("copies")
+            )
+            restored = (
+                update(Book)
+                .where(Book.id == copies.c.book_id)
+                .values(
+                    number_of_copies=Book.number_of_copies + copies.c.copies,
+                    updated_at=now,
+                )
+                .returning(Book.id)
+                .cte("restored")
+            )
+            result = await db.execute(
+                select(returned.c.id, returned.c.book_id).add_cte(restored)
+            )
+            closed = dict(result.all())
+
+            failed = [issue_id for issue_id in issue_ids if issue_id not in closed]
+            already_returned = set()
+            if failed:
+                result = await db.execute(
+                    select(BookIssue.id).where(
+                        BookIssue.id == any_(literal(failed, ARRAY(Integer)))
                     )
                 )
+                already_returned = set(result.scalars().all())
+
+            await db.commit()
+            bookCache.invalidate(*set(closed.values()))
+
+            results, seen = [], set()
+            for issue_id in batch.issue_ids:
+                if issue_id in seen:
+                    results.append(
+                        BatchItemResult(
+                            issue_id=issue_id, status="failed", detail="duplicate in request"
+                        )
+                    )
+                elif issue_id in closed:
+                    results.append(
+                        BatchItemResult(
+                            issue_id=issue_id, book_id=closed[issue_id], status="returned"
+                        )
+                    )
+                else:
+                    results.append(
+                        BatchItemResult(
+                            issue_id=issue_id,
+                            status="failed",
+                            detail=(
+                                "book issue already returned"
+                                if issue_id in already_returned
+                                else "book issue not found"
+                            ),
+                        )
+                    )
+                seen.add(issue_id)
+            return results
+
+        except Exception as e:
+            await db.rollback()
+            raise Exception(f"Error returning books: {str(e)}")
+
+    # (book_id, student_id, [issue ids oldest first]) of every book a student holds
+    # more than once, left behind by the old read-then-write checkout
+    @staticmethod
+    def duplicateOpenLoansQuery() -> Select:
+        return (
+            select(
+                BookIssue.book_id,
+                BookIssue.student_id,
+                func.array_agg(aggregate_order_by(BookIssue.id, BookIssue.id)).label(
+                    "issue_ids"
+                ),
+            )
+            .where(BookIssue.return_date.is_(None))
+            .group_by(BookIssue.book_id, BookIssue.student_id)
+            .having(func.count() > 1)
+            .order_by(BookIssue.book_id, BookIssue.student_id)
+        )
 
-            return issue_report
+    # keeps the oldest open loan of each duplicate and returns the others today,
+    # putting their copies back. returns the closed issue ids
+    @staticmethod
+    async def closeDuplicateOpenLoans(db: AsyncSession) -> List[int]:
+        try:
+            result = await db.execute(BookIssueController.duplicateOpenLoansQuery())
+            extras = [
+                issue_id for row in result.all() for issue_id in row.issue_ids[1:]
+            ]
+            if not extras:
+                return []
+
+            now = datetime.now()
+            returned = (
+                update(BookIssue)
+                .where(
+                    BookIssue.id == any_(literal(extras, ARRAY(Integer))),
+                    BookIssue.return_date.is_(None),
+                )
+                .values(return_date=date.today(), updated_at=now)
+                .returning(BookIssue.id, BookIssue.book_id)
+                .cte("returned")
+            )
+            copies = (
+                select(returned.c.book_id, func.count().label("copies"))
+                .group_by(returned.c.book_id)
+                .subquery("copies")
+            )
+            restored = (
+                update(Book)
+                .where(Book.id == copies.c.book_id)
+                .values(
+                    number_of_copies=Book.number_of_copies + copies.c.copies,
+                    updated_at=now,
+                )
+                .returning(Book.id)
+                .cte("restored")
+            )
+            result = await db.execute(
+                select(returned.c.id, returned.c.book_id).add_cte(restored)
+            )
+            closed = dict(result.all())
+
+            await db.commit()
+            bookCache.invalidate(*set(closed.values()))
+            return sorted(closed)
+
+        except Exception as e:
+            await db.rollback()
+            raise Exception(f"Error closing duplicate loans: {str(e)}")
+
+    # one query: the student row is outer joined to its open loans so a missing student
+    # (no rows) and a student without loans (one row, no book) are told apart
+    @staticmethod
+    def openLoansQuery(student_id: int) -> Select:
+        return (
+            select(
+                Student.id,
+                Book,
+                (BookIssue.due_date < func.current_date()).label("is_overdue"),
+            )
+            .select_from(Student)
+            .outerjoin(
+                BookIssue,
+                and_(
+                    BookIssue.student_id == Student.id,
+                    BookIssue.return_date.is_(None),
+                ),
+            )
+            .outerjoin(Book, Book.id == BookIssue.book_id)
+            .where(Student.id == student_id)
+            .order_by(BookIssue.due_date, BookIssue.id)
+        )
+
+    @staticmethod
+    async def getBooksIssuedToStudent(
+        db: AsyncSession, student_id: int
+    ) -> List[IssuedBooksResponse]:
+        try:
+            result = await db.execute(BookIssueController.openLoansQuery(student_id))
+            rows = result.all()
+            if not rows:
+                raise HTTPException(status_code=404, detail="student not found")
+
+            return [
+                IssuedBooksResponse(
+                    book=BookRead.model_validate(book),
+                    is_overdue=is_overdue,
+                )
+                for _, book, is_overdue in rows
+                if book is not None
+            ]
 
         except HTTPException:
             raise
         except Exception as e:
             await db.rollback()
-            raise Exception(f"Error fetching books reports: {str(e)}")
+            raise Exception(f"Error fetching books issued to student: {str(e)}")
+
+    # returned loans of a student in one table, past the cursor's (return date, id)
+    @staticmethod
+    def loanHistorySource(
+        source: Table, student_id: int, after_key: Optional[tuple] = None
+    ) -> Select:
+        query = select(
+            source.c.id,
+            source.c.book_id,
+            source.c.issue_date,
+            source.c.due_date,
+            source.c.return_date,
+        ).where(
+            source.c.student_id == student_id,
+            source.c.return_date.is_not(None),
+        )
+        if after_key:
+            query = query.where(tuple_(source.c.return_date, source.c.id) < after_key)
+        return query
+
+    # returned loans, most recently returned first, paged with an after cursor. loans
+    # moved to the archive are only included when asked for, otherwise the history
+    # covers what BookIssues still holds. archived ids keep their original value, so
+    # one cursor pages across both tables
+    @staticmethod
+    def loanHistoryQuery(
+        student_id: int,
+        limit: int = 20,
+        after: Optional[str] = None,
+        include_archive: bool = False,
+    ) -> Select:
+        after_key = None
+        if after:
+            after_key = tuple(decodeCursor(after, date, int))
+
+        loans = BookIssueController.loanHistorySource(
+            BookIssue.__table__, student_id, after_key
+        )
+        if include_archive:
+            loans = union_all(
+                loans,
+                BookIssueController.loanHistorySource(
+                    BookIssueArchive.__table__, student_id, after_key
+                ),
+            )
+        loans = loans.subquery("loans")
+
+        return (
+            select(
+                loans.c.id,
+                loans.c.issue_date,
+                loans.c.due_date,
+                loans.c.return_date,
+                Book,
+                (loans.c.return_date > loans.c.due_date).label("returned_late"),
+            )
+            .join(Book, Book.id == loans.c.book_id)
+            .order_by(loans.c.return_date.desc(), loans.c.id.desc())
+            .limit(limit + 1)
+        )
+
+    @staticmethod
+    async def getStudentLoanHistory(
+        db: AsyncSession,
+        student_id: int,
+        limit: int = 20,
+        after: Optional[str] = None,
+        include_archive: bool = False,
+    ) -> tuple[List[LoanHistoryResponse], Optional[str]]:
+        try:
+            result = await db.execute(
+                BookIssueController.loanHistoryQuery(
+                    student_id, limit, after, include_archive
+                )
+            )
+            rows = result.all()
+
+            next_cursor = None
+            if len(rows) > limit:
+                rows = rows[:limit]
+                next_cursor = encodeCursor([rows[-1].return_date, rows[-1].id])
+
+            return [
+                LoanHistoryResponse(
+                    issue_id=row.id,
+                    book=BookRead.model_validate(row.Book),
+                    issue_date=row.issue_date,
+                    due_date=row.due_date,
+                    return_date=row.return_date,
+                    returned_late=row.returned_late,
+                )
+                for row in rows
+            ], next_cursor
+
+        except ValueError:
+            raise
+        except Exception as e:
+            raise Exception(f"Error fetching loan history: {str(e)}")
+
+    # circulation report as a single joined core query; book and student fields are
+    # selected under a prefix and regrouped per row, so no per issue lookups are needed.
+    # every filter is applied inside each source table, which lets postgres prune the
+    # archive partitions outside the issue date range
+    @staticmethod
+    def reportSource(
+        source: Table,
+        issued_from: Optional[date] = None,
+        issued_to: Optional[date] = None,
+        status: Optional[str] = None,
+        department: Optional[str] = None,
+        category: Optional[str] = None,
+        last_id: Optional[int] = None,
+    ) -> Select:
+        is_overdue = source.c.due_date < func.current_date()
+        query = (
+            select(
+                source.c.id.label("issue_id"),
+                source.c.issue_date,
+                source.c.due_date,
+                source.c.return_date,
+                is_overdue.label("is_overdue"),
+                source.c.return_date.is_not(None).label("is_returned"),
+                *[getattr(Book, f).label(f"book_{f}") for f in BookRead.model_fields],
+                *[
+                    getattr(Student, f).label(f"student_{f}")
+                    for f in StudentRead.model_fields
+                ],
+            )
+            .join(Book, Book.id == source.c.book_id)
+            .join(Student, Student.id == source.c.student_id)
+        )
+
+        if issued_from:
+            query = query.where(source.c.issue_date >= issued_from)
+        if issued_to:
+            query = query.where(source.c.issue_date <= issued_to)
+        if status == "open":
+            query = query.where(source.c.return_date.is_(None))
+        elif status == "returned":
+            query = query.where(source.c.return_date.is_not(None))
+        elif status == "overdue":
+            query = query.where(source.c.return_date.is_(None), is_overdue)
+        if department:
+            query = query.where(Student.department == department)
+        if category:
+            query = query.where(Book.category == category)
+        if last_id is not None:
+            query = query.where(source.c.id > last_id)
+        return query
+
+    # archived loans are all returned, so the archive is only read when asked for and
+    # the status filter can still match something there
+    @staticmethod
+    def reportQuery(
+        issued_from: Optional[date] = None,
+        issued_to: Optional[date] = None,
+        status: Optional[str] = None,
+        department: Optional[str] = None,
+        category: Optional[str] = None,
+        after: Optional[str] = None,
+        limit: Optional[int] = None,
+        include_archive: bool = False,
+    ) -> Select:
+        last_id = None
+        if after:
+            (last_id,) = decodeCursor(after, int)
+
+        filters = dict(
+            issued_from=issued_from,
+            issued_to=issued_to,
+            status=status,
+            department=department,
+            category=category,
+            last_id=last_id,
+        )
+        query = BookIssueController.reportSource(BookIssue.__table__, **filters)
+        if include_archive and status in (None, "returned"):
+            report = union_all(
+                query,
+                BookIssueController.reportSource(BookIssueArchive.__table__, **filters),
+            ).subquery("report")
+            query = select(report).order_by(report.c.issue_id)
+        else:
+            query = query.order_by(BookIssue.id)
+
+        if limit:
+            # one extra row tells whether another page follows
+            query = query.limit(limit + 1)
+        return query
+
+    @staticmethod
+    def reportRow(row) -> dict:
+        return IssueReportResponse(
+            issue_id=row["issue_id"],
+            issue_date=row["issue_date"],
+            due_date=row["due_date"],
+            return_date=row["return_date"],
+            is_overdue=row["is_overdue"],
+            is_returned=row["is_returned"],
+            book=BookRead(**{f: row[f"book_{f}"] for f in BookRead.model_fields}),
+            student=StudentRead(
+                **{f: row[f"student_{f}"] for f in StudentRead.model_fields}
+            ),
+        ).model_dump(mode="json")
+
+    # streams the report from a server side cursor as ndjson envelopes: data_chunk lines,
+    # then a complete line carrying the row count and the cursor of the next page.
+    # the request session is closed once the route returns, so the stream opens its own
+    @staticmethod
+    async def streamIssueReport(
+        query: Select,
+        limit: Optional[int] = None,
+        chunk_size: int = EXPORT_CHUNK_SIZE,
+    ) -> AsyncGenerator[str, None]:
+        try:
+            sent = 0
+            last_id = None
+            has_next = False
+            async with AsyncSessionLocal() as db:
+                result = await db.stream(query.execution_options(yield_per=chunk_size))
+                async for partition in result.mappings().partitions():
+                    if limit and sent + len(partition) > limit:
+                        partition = partition[: limit - sent]
+                        has_next = True
+                    if partition:
+                        sent += len(partition)
+                        last_id = partition[-1]["issue_id"]
+                        chunk = [BookIssueController.reportRow(row) for row in partition]
+                        yield json.dumps({"type": "data_chunk", "content": chunk}) + "\n"
+                    if has_next:
+                        break
+
+            yield (
+                json.dumps(
+                    {
+                        "type": "complete",
+                        "content": {
+                            "total_rows": sent,
+                            "has_next": has_next,
+                            "next_cursor": encodeCursor([last_id]) if has_next else None,
+                        },
+                    }
+                )
+                + "\n"
+            )
+        except Exception as e:
+            yield json.dumps({"type": "error", "content": str(e)}) + "\n"
@@ -1,249 +1,751 @@
-from datetime import timedelta, date
+from datetime import timedelta, date, datetime
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
-from sqlalchemy import and_, select
-import smtplib
+from apscheduler.triggers.interval import IntervalTrigger
+from sqlalchemy import (
+    Date,
+    Integer,
+    and_,
+    any_,
+    case,
+    delete,
+    exists,
+    func,
+    insert,
+    literal,
+    or_,
+    select,
+    tuple_,
+    update,
+)
+from sqlalchemy.dialects.postgresql import ARRAY
 import asyncio
-from typing import AsyncGenerator, List, Callable
-
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
-from models.models import BookIssue, ReminderHistory
-from schemas.reminder import EmailConfig, ReminderRecord
+import random
+from itertools import groupby
+from typing import AsyncGenerator, List, Callable, Optional
+
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from models.models import (
+    Book,
+    BookIssue,
+    EmailOutbox,
+    ReminderHistory,
+    Student,
+)
+from schemas.reminder import EmailConfig
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
+from utils.advisoryLock import advisoryLock
+from utils.rateLimiter import RateLimiter
+from utils.reminderDedup import ReminderDedupIndex
+from utils.reminderSchedule import (
+    OVERDUE_CADENCE_DAYS,
+    REMINDER_WINDOW_DAYS,
+    nextReminderOn,
+)
+from utils.reminderTemplates import ReminderTemplates
+from utils.smtpPool import SMTPConnectionPool
+
+REMINDER_CHUNK_SIZE = 500
+
+# outbox delivery: rows claimed per batch, a claim expires after the lease, and failed
+# messages are retried after 1, 2, 4, ... minutes (at most an hour) until dead
+OUTBOX_BATCH_SIZE = 100
+OUTBOX_LEASE_SECONDS = 600
+OUTBOX_MAX_ATTEMPTS = 6
+OUTBOX_BACKOFF_SECONDS = 60
+OUTBOX_MAX_BACKOFF_SECONDS = 3600
 
 
 # email controller (create, send, etc)
+# messages go out over a pool of persistent smtp sessions, see SMTPConnectionPool
 class EmailController:
     def __init__(self, config: EmailConfig):
         self.config = config
+        self.pool = SMTPConnectionPool(config)
+
+    def createMessage(self, to_email: str, subject: str, body: str) -> MIMEMultipart:
+        msg = MIMEMultipart()
+        msg["From"] = f"{self.config.sender_name} <{self.config.sender_email}>"
+        msg["To"] = to_email
+        msg["Subject"] = subject
+
+        msg.attach(MIMEText(body, "html"))
+        return msg
 
     async def sendEmail(self, to_email: str, subject: str, body: str) -> bool:
-        def _send_sync():
+        try:
+            await self.pool.send(self.createMessage(to_email, subject, body))
+        except Exception as e:
+            raise Exception(f"Failed to send email to {to_email}: {str(e)}")
+
+        print(f"Email sent to {to_email}")
+        return True
+
+    async def close(self):
+        await self.pool.close()
+
+
+# durable delivery of queued emails. claimed rows are leased, so a dispatcher that
+# died mid batch only delays its messages until the lease runs out. failures are
+# retried with exponential backoff and dead lettered after OUTBOX_MAX_ATTEMPTS.
+# reminder_index is the reminder pass's sent today index of this process, released
+# reminders are dropped from it so a later pass the same day reminds them again
+class EmailOutboxController:
+    def __init__(
+        self,
+        email_service: EmailController,
+        db_session_factory: Callable[[], AsyncGenerator[AsyncSession, None]],
+        reminder_index: Optional[ReminderDedupIndex] = None,
+    ):
+        self.email_service = email_service
+        self.db_session_factory = db_session_factory
+        self.reminder_index = reminder_index
+        self.rate_limiter = RateLimiter(
+            email_service.config.rate_limit_per_second,
+            email_service.config.rate_limit_burst,
+        )
+
+    # adds rendered (to_email, subject, body) messages and returns their ids in the
+    # same order, the caller commits
+    @staticmethod
+    async def enqueue(
+        db: AsyncSession, messages: List[tuple[str, str, str]]
+    ) -> List[int]:
+        if not messages:
+            return []
+        now = datetime.now()
+        result = await db.execute(
+            insert(EmailOutbox).returning(EmailOutbox.id, sort_by_parameter_order=True),
+            [
+                {
+                    "to_email": to_email,
+                    "subject": subject,
+                    "body": body,
+                    "status": "pending",
+                    "attempts": 0,
+                    "next_attempt_at": now,
+                    "created_at": now,
+                    "updated_at": now,
+                }
+                for to_email, subject, body in messages
+            ],
+        )
+        return list(result.scalars())
+
+    @staticmethod
+    def backoff(attempts: int) -> timedelta:
+        seconds = min(
+            OUTBOX_BACKOFF_SECONDS * 2 ** (attempts - 1), OUTBOX_MAX_BACKOFF_SECONDS
+        )
+        return timedelta(seconds=seconds * random.uniform(0.8, 1.2))
+
+    # concurrent dispatchers never claim the same row (SKIP LOCKED)
+    async def claim_batch(self, db: AsyncSession, limit: int = OUTBOX_BATCH_SIZE) -> List:
+        now = datetime.now()
+        claimable = (
+            select(EmailOutbox.id)
+            .where(
+                or_(
+                    and_(
+                        EmailOutbox.status == "pending",
+                        EmailOutbox.next_attempt_at <= now,
+                    ),
+                    and_(
+                        EmailOutbox.status == "sending",
+                        EmailOutbox.claimed_at
+                        < now - timedelta(seconds=OUTBOX_LEASE_SECONDS),
+                    ),
+                )
+            )
+            .order_by(EmailOutbox.next_attempt_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        result = await db.execute(
+            update(EmailOutbox)
+            .where(EmailOutbox.id.in_(claimable))
+            .values(
+                status="sending",
+                claimed_at=now,
+                attempts=EmailOutbox.attempts + 1,
+                updated_at=now,
+            )
+            .returning(
+                EmailOutbox.id,
+                EmailOutbox.to_email,
+                EmailOutbox.subject,
+                EmailOutbox.body,
+                EmailOutbox.attempts,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        batch = result.all()
+        await db.commit()
+        return batch
+
+    async def deliver(self, message) -> Optional[str]:
+        await self.rate_limiter.acquire()
+        try:
+            await self.email_service.sendEmail(
+                message.to_email, message.subject, message.body
+            )
+            return None
+        except Exception as e:
+            return str(e)
+
+    # one bulk update by primary key for the whole batch. the reminders of a message
+    # that went dead are released in the same commit, see release_reminders
+    async def record_results(self, db: AsyncSession, batch: List, errors: List):
+        now = datetime.now()
+        rows = []
+        for message, error in zip(batch, errors):
+            if error is None:
+                rows.append(
+                    {"id": message.id, "status": "sent", "sent_at": now, "last_error": None}
+                )
+            elif message.attempts >= OUTBOX_MAX_ATTEMPTS:
+                rows.append({"id": message.id, "status": "dead", "last_error": error})
+            else:
+                rows.append(
+                    {
+                        "id": message.id,
+                        "status": "pending",
+                        "next_attempt_at": now + self.backoff(message.attempts),
+                        "last_error": error,
+                    }
+                )
+        for row in rows:
+            row["updated_at"] = now
+        await db.execute(update(EmailOutbox), rows)
+        released = await self.release_reminders(
+            db, [row["id"] for row in rows if row["status"] == "dead"]
+        )
+        await db.commit()
+        if self.reminder_index is not None:
+            self.reminder_index.discard(
+                self.reminder_index.key(book_issue_id, reminder_type)
+                for book_issue_id, reminder_type in released
+            )
+
+    # a dead message never reached the student, so its reminder history rows are
+    # deleted and its open loans are due a reminder again today. the next pass queues
+    # a fresh email for them. the schedule is not a change to the loan, so updated_at
+    # stays put. returns the released (book_issue_id, reminder_type) pairs
+    @staticmethod
+    async def release_reminders(
+        db: AsyncSession, outbox_ids: List[int]
+    ) -> List[tuple[int, str]]:
+        if not outbox_ids:
+            return []
+        released = (
+            delete(ReminderHistory)
+            .where(
+                ReminderHistory.email_outbox_id
+                == any_(literal(outbox_ids, ARRAY(Integer)))
+            )
+            .returning(ReminderHistory.book_issue_id, ReminderHistory.reminder_type)
+            .cte("released")
+        )
+        rescheduled = (
+            update(BookIssue)
+            .where(
+                BookIssue.id.in_(select(released.c.book_issue_id)),
+                BookIssue.return_date.is_(None),
+            )
+            .values(
+                next_reminder_on=func.least(BookIssue.next_reminder_on, date.today()),
+                updated_at=BookIssue.updated_at,
+            )
+            .returning(BookIssue.id)
+            .cte("rescheduled")
+        )
+        result = await db.execute(
+            select(released.c.book_issue_id, released.c.reminder_type).add_cte(
+                rescheduled
+            )
+        )
+        return [tuple(row) for row in result.all()]
+
+    # sends every message that is due, batch by batch, until none is left
+    async def dispatch(self) -> dict:
+        sent, retrying, dead = 0, 0, 0
+
+        async for db in self.db_session_factory():
             try:
-                msg = MIMEMultipart()
-                msg["From"] = f"{self.config.sender_name} <{self.config.sender_email}>"
-                msg["To"] = to_email
-                msg["Subject"] = subject
+                while True:
+                    batch = await self.claim_batch(db)
+                    if not batch:
+                        break
 
-                msg.attach(MIMEText(body, "html"))
+                    errors = await asyncio.gather(
+                        *[self.deliver(message) for message in batch]
+                    )
+                    await self.record_results(db, batch, errors)
 
-                with smtplib.SMTP(
-                    self.config.smtp_server, self.config.smtp_port
-                ) as server:
-                    server.starttls()
-                    server.login(self.config.sender_email, self.config.sender_password)
-                    server.send_message(msg)
+                    for message, error in zip(batch, errors):
+                        if error is None:
+                            sent += 1
+                        elif message.attempts >= OUTBOX_MAX_ATTEMPTS:
+                            dead += 1
+                        else:
+                            retrying += 1
 
-                return True
+                if sent or retrying or dead:
+                    print(f"outbox: {sent} sent, {retrying} to retry, {dead} dead.")
+                return {"sent": sent, "retrying": retrying, "dead": dead}
 
             except Exception as e:
-                raise Exception(f"Failed to send email to {to_email}: {str(e)}")
-
-        loop = asyncio.get_event_loop()
-        result = await loop.run_in_executor(None, _send_sync)
+                print(f"Error: {str(e)}")
+                await db.rollback()
+                raise
 
-        if result:
-            print(f"Email sent to {to_email}")
-        return result
+    @staticmethod
+    async def get_stats(db: AsyncSession) -> dict:
+        result = await db.execute(
+            select(
+                EmailOutbox.status,
+                func.count(),
+                func.min(EmailOutbox.created_at),
+            ).group_by(EmailOutbox.status)
+        )
+        counts = {"pending": 0, "sending": 0, "sent": 0, "dead": 0}
+        oldest_pending = None
+        for status, count, oldest in result.all():
+            counts[status] = count
+            if status == "pending":
+                oldest_pending = oldest
+        return {**counts, "oldest_pending": oldest_pending}
+
+    # puts dead letters back in the queue, e.g. after fixing smtp credentials. their
+    # reminders were released when they died, so a pass that ran since may already
+    # have queued a fresh email for the same loans
+    @staticmethod
+    async def requeue_dead(db: AsyncSession) -> int:
+        now = datetime.now()
+        result = await db.execute(
+            update(EmailOutbox)
+            .where(EmailOutbox.status == "dead")
+            .values(status="pending", attempts=0, next_attempt_at=now, updated_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        return result.rowcount
 
 
 # overdue functions controller
 # functions name describe their functions
 class OverdueTrackingController:
+    # digest sends one email per student covering all of their reminders of the day,
+    # instead of one email per loan. email bodies come from templates/reminders.
+    # incremental passes only select loans whose next_reminder_on has come: once on
+    # entering the pre due window, on the due date, on the first overdue day and then
+    # every overdue_cadence_days. otherwise every loan in the window is reminded daily
     def __init__(
         self,
         email_service: EmailController,
         db_session_factory: Callable[[], AsyncGenerator[AsyncSession, None]],
+        digest: bool = False,
+        templates: Optional[ReminderTemplates] = None,
+        incremental: bool = False,
+        overdue_cadence_days: int = OVERDUE_CADENCE_DAYS,
     ):
         self.email_service = email_service
         self.db_session_factory = db_session_factory
-        self.reminder_history: List[ReminderRecord] = []
+        self.digest = digest
+        self.incremental = incremental
+        self.overdue_cadence_days = overdue_cadence_days
+        self.templates = templates or ReminderTemplates()
+        self.sent_today = ReminderDedupIndex()
 
+    # only today's reminders are loaded, so startup does not grow with the history
     async def init(self):
         async for db in self.db_session_factory():
             try:
-                result = await db.execute(select(ReminderHistory))
-                self.reminder_history = result.scalars().all()
+                await self.sent_today.load(db, date.today())
             except Exception as e:
                 await db.rollback()
                 raise e
 
-    async def get_books_needing_reminders(self, db: AsyncSession) -> List:
-        today = date.today()
-        reminder_start_date = today + timedelta(days=5)
+    # drops candidates this process already reminded today and claims the rest before
+    # anything is awaited, so an overlapping manual and scheduled run cannot both queue
+    # the same reminder. returns the claimed rows and their keys, settled in the index
+    # once the chunk commits
+    def claim_reminders(self, chunk: List, today: date) -> tuple[List, List[int]]:
+        self.sent_today.rollover(today)
+        claimed, keys = [], []
+        for reminder in chunk:
+            if self.sent_today.contains(reminder.id, reminder.reminder_type):
+                continue
+            claimed.append(reminder)
+            keys.append(self.sent_today.claim(reminder.id, reminder.reminder_type))
+        return claimed, keys
+
+    # open loans due within REMINDER_WINDOW_DAYS or overdue, with the student and book
+    # fields the email needs, minus those already reminded today (anti join on
+    # ReminderHistory). grouped by student and keyset paged on (student_id, id) so each
+    # chunk can commit. with partitions > 1 only the students with
+    # student_id % partitions == partition are selected.
+    # scheduled passes only select loans whose next_reminder_on has come, a range on
+    # the open loan schedule index, so they read the loans that are due a reminder
+    # today and not the whole overdue backlog
+    @staticmethod
+    def books_needing_reminders_query(
+        today: date,
+        after: tuple[int, int] = (0, 0),
+        limit: Optional[int] = REMINDER_CHUNK_SIZE,
+        partition: int = 0,
+        partitions: int = 1,
+        scheduled: bool = False,
+        student_id: Optional[int] = None,
+    ):
+        reminder_start_date = today + timedelta(days=REMINDER_WINDOW_DAYS)
+        reminder_type = case(
+            (BookIssue.due_date >= today, "pre_due"), else_="overdue"
+        )
+        already_sent = exists().where(
+            ReminderHistory.book_issue_id == BookIssue.id,
+            ReminderHistory.reminder_type == reminder_type,
+            ReminderHistory.sent_date == today,
+        )
 
+        # scheduled passes start from the loans due a reminder today, found on the
+        # schedule index and materialized. sorting them on the cte's own columns keeps
+        # postgres from walking every open loan in student order to fill a chunk
+        order_key = (BookIssue.student_id, BookIssue.id)
+        scheduled_loans = None
+        if scheduled:
+            scheduled_loans = (
+                select(BookIssue.id, BookIssue.student_id)
+                .where(
+                    BookIssue.return_date.is_(None),
+                    BookIssue.next_reminder_on <= today,
+                )
+                .cte("scheduled_loans")
+                .prefix_with("MATERIALIZED")
+            )
+            order_key = (scheduled_loans.c.student_id, scheduled_loans.c.id)
+
+        query = select(
+            BookIssue.id,
+            BookIssue.student_id,
+            BookIssue.due_date,
+            reminder_type.label("reminder_type"),
+            Student.name.label("student_name"),
+            Student.email.label("student_email"),
+            Book.title.label("book_title"),
+        )
+        if scheduled_loans is not None:
+            query = query.select_from(scheduled_loans).join(
+                BookIssue, BookIssue.id == scheduled_loans.c.id
+            )
         query = (
-            select(BookIssue)
+            query.join(Student, Student.id == BookIssue.student_id)
+            .join(Book, Book.id == BookIssue.book_id)
             .where(
                 and_(
                     BookIssue.return_date.is_(None),
                     BookIssue.due_date <= reminder_start_date,
+                    tuple_(*order_key) > after,
+                    ~already_sent,
                 )
             )
-            .options(selectinload(BookIssue.student), selectinload(BookIssue.book))
+            .order_by(*order_key)
+            .limit(limit)
         )
-        result = await db.execute(query)
-        issues = result.scalars().all()
-
-        return issues
-
-    # check for unsent reminders
-    async def should_send_reminder(
-        self, issue, reminder_type: str, db: AsyncSession
-    ) -> bool:
-        today = date.today()
-
-        query = select(ReminderHistory).where(
-            and_(
-                ReminderHistory.book_issue_id == issue.id,
-                ReminderHistory.reminder_type == reminder_type,
-                ReminderHistory.sent_date == today,
+        if partitions > 1:
+            query = query.where(BookIssue.student_id % partitions == partition)
+        if student_id is not None:
+            query = query.where(BookIssue.student_id == student_id)
+        return query
+
+    # in digest mode a full chunk gives back the rows of its last student, who may
+    # continue in the next chunk, so every student gets a single digest. a student
+    # with a whole chunk of reminders or more has nothing to give back, so their chunk
+    # is extended to the end of their rows instead. the cursor is the last row kept
+    async def get_books_needing_reminders(
+        self,
+        db: AsyncSession,
+        today: date,
+        after: tuple[int, int] = (0, 0),
+        partition: int = 0,
+        partitions: int = 1,
+    ) -> List:
+        result = await db.execute(
+            self.books_needing_reminders_query(
+                today,
+                after,
+                limit=REMINDER_CHUNK_SIZE,
+                partition=partition,
+                partitions=partitions,
+                scheduled=self.incremental,
             )
         )
-        result = await db.execute(query)
-        existing_reminder = result.scalar_one_or_none()
-        return existing_reminder is None
-
-    # store sent reminders
-    async def record_reminder_sent(
-        self, issue, reminder_type: str, days_before_due: int, db: AsyncSession
+        chunk = result.all()
+
+        if self.digest and len(chunk) == REMINDER_CHUNK_SIZE:
+            last_student_id = chunk[-1].student_id
+            complete = [row for row in chunk if row.student_id != last_student_id]
+            if complete:
+                return complete
+            result = await db.execute(
+                self.books_needing_reminders_query(
+                    today,
+                    (last_student_id, chunk[-1].id),
+                    limit=None,
+                    partition=partition,
+                    partitions=partitions,
+                    scheduled=self.incremental,
+                    student_id=last_student_id,
+                )
+            )
+            chunk += result.all()
+        return chunk
+
+    # one multi row insert for every reminder of a chunk, written with its outbox rows
+    # and linked to the email carrying each one, and one update moving each loan's
+    # next_reminder_on on. the schedule is not a change to the loan itself, so
+    # updated_at (and the export cursor) stays put
+    async def record_reminders_sent(
+        self,
+        reminders: List,
+        today: date,
+        db: AsyncSession,
+        outbox_ids: Optional[List[int]] = None,
     ):
-        reminder_record = ReminderHistory(
-            student_id=issue.student_id,
-            book_issue_id=issue.id,
-            reminder_type=reminder_type,
-            sent_date=date.today(),
-            days_before_due=days_before_due,
-        )
-        db.add(reminder_record)
-        await db.commit()
+        if not reminders:
+            return
+        outbox_ids = outbox_ids or [None] * len(reminders)
+        schedule = select(
+            func.unnest(literal([r.id for r in reminders], ARRAY(Integer))).label("id"),
+            func.unnest(
+                literal(
+                    [
+                        nextReminderOn(r.due_date, today, self.overdue_cadence_days)
+                        for r in reminders
+                    ],
+                    ARRAY(Date),
+                )
+            ).label("next_reminder_on"),
+        ).subquery("schedule")
+        await db.execute(
+            update(BookIssue)
+            .where(BookIssue.id == schedule.c.id)
+            .values(
+                next_reminder_on=schedule.c.next_reminder_on,
+                updated_at=BookIssue.updated_at,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        await db.execute(
+            insert(ReminderHistory),
+            [
+                {
+                    "student_id": reminder.student_id,
+                    "book_issue_id": reminder.id,
+                    "reminder_type": reminder.reminder_type,
+                    "sent_date": today,
+                    "days_before_due": (reminder.due_date - today).days,
+                    "email_outbox_id": outbox_id,
+                    "created_at": datetime.now(),
+                }
+                for reminder, outbox_id in zip(reminders, outbox_ids)
+            ],
+        )
 
-        print(f"Recorded reminder: {reminder_type} for issue {issue.id}")
+    # process reminders chunk by chunk: one candidate query, then the rendered emails
+    # go to the outbox and the reminders to the history in one multi row insert each,
+    # committed together. delivery is left to the outbox dispatcher, so a slow or
+    # failing smtp server no longer holds up or aborts the pass. a partition covers a
+    # disjoint set of students, so partitions can run on different workers.
+    # a loan's next_reminder_on moves in the same commit as its reminder, so a failed
+    # pass leaves the rest scheduled for the next one, and missed days need no
+    # catching up: every loan whose reminder day has passed is selected
+    async def process_reminders(self, partition: int = 0, partitions: int = 1):
+        today = date.today()
+        reminders, queued = 0, 0
 
-    # process reminders
-    async def process_reminders(self):
         async for db in self.db_session_factory():
+            keys = []
             try:
-                issues = await self.get_books_needing_reminders(db)
-
-                for issue in issues:
-                    await self.process_single_issue(issue, db)
-
-                print(f"sent {len(issues)} issues.")
-                break
+                # picks up templates edited since this process loaded them
+                self.templates.reload_if_changed()
+                # the history decides what was sent today, including reminders another
+                # process released since this one last looked
+                await self.sent_today.load(db, today)
+
+                after = (0, 0)
+                while True:
+                    chunk = await self.get_books_needing_reminders(
+                        db, today, after, partition, partitions
+                    )
+                    if not chunk:
+                        break
+                    after = (chunk[-1].student_id, chunk[-1].id)
+                    chunk, keys = self.claim_reminders(chunk, today)
+                    if not chunk:
+                        continue
+
+                    messages = self.render_chunk(chunk, today)
+                    outbox_ids = await EmailOutboxController.enqueue(db, messages)
+                    await self.record_reminders_sent(
+                        chunk, today, db, self.message_per_reminder(chunk, outbox_ids)
+                    )
+                    await db.commit()
+                    self.sent_today.settle(keys)
+                    keys = []
+                    reminders += len(chunk)
+                    queued += len(messages)
+
+                print(f"queued {queued} emails covering {reminders} reminders.")
+                return {
+                    "reminders": reminders,
+                    "emails_queued": queued,
+                }
 
             except Exception as e:
                 print(f"Error: {str(e)}")
                 await db.rollback()
+                # the uncommitted chunk was not recorded, let the next run retry it
+                self.sent_today.discard(keys)
                 raise
 
-    # process single reminder
-    async def process_single_issue(self, issue, db: AsyncSession):
-        today = date.today()
-        days_until_due = (issue.due_date - today).days
-
-        student = issue.student
-        book = issue.book
-
-        if days_until_due >= 0:
-            if days_until_due <= 5 and await self.should_send_reminder(
-                issue, "pre_due", db
-            ):
-                subject, body = self.create_pre_due_reminder(
-                    student.name, book.title, issue.due_date, days_until_due
-                )
-
-                if await self.email_service.sendEmail(student.email, subject, body):
-                    await self.record_reminder_sent(
-                        issue, "pre_due", days_until_due, db
-                    )
-
+    # the template and context of one candidate
+    def reminder_context(self, reminder, today: date) -> tuple[str, dict]:
+        days_until_due = (reminder.due_date - today).days
+        context = {
+            "student_name": reminder.student_name,
+            "book_title": reminder.book_title,
+            "due_date": reminder.due_date,
+        }
+        if reminder.reminder_type == "pre_due":
+            return "pre_due", {**context, "days_remaining": days_until_due}
+        return "overdue", {**context, "days_overdue": abs(days_until_due)}
+
+    # one email for all reminders of a student, overdue books first
+    def digest_context(self, reminders: List, today: date) -> tuple[str, dict]:
+        overdue = [
+            {
+                "title": r.book_title,
+                "due_date": r.due_date,
+                "days": (today - r.due_date).days,
+            }
+            for r in reminders
+            if r.reminder_type == "overdue"
+        ]
+        pre_due = [
+            {
+                "title": r.book_title,
+                "due_date": r.due_date,
+                "days": (r.due_date - today).days,
+            }
+            for r in reminders
+            if r.reminder_type == "pre_due"
+        ]
+        return "digest", {
+            "student_name": reminders[0].student_name,
+            "overdue": overdue,
+            "pre_due": pre_due,
+        }
+
+    # lines up one value per email of a chunk (as rendered by render_chunk) with the
+    # reminders it covers: one each, or in digest mode every reminder of the student
+    def message_per_reminder(self, chunk: List, values: List) -> List:
+        if not self.digest:
+            return values
+        return [
+            value
+            for (_, rows), value in zip(
+                groupby(chunk, key=lambda r: r.student_id), values
+            )
+            for _ in rows
+        ]
+
+    # the (to_email, subject, body) of every email of a chunk
+    def render_chunk(self, chunk: List, today: date) -> List[tuple[str, str, str]]:
+        if self.digest:
+            students = [
+                list(rows) for _, rows in groupby(chunk, key=lambda r: r.student_id)
+            ]
+            recipients = [rows[0].student_email for rows in students]
+            messages = [self.digest_context(rows, today) for rows in students]
         else:
-            days_overdue = abs(days_until_due)
-            if await self.should_send_reminder(issue, "overdue", db):
-                subject, body = self.create_overdue_reminder(
-                    student.name, book.title, issue.due_date, days_overdue
-                )
-
-                if await self.email_service.sendEmail(student.email, subject, body):
-                    await self.record_reminder_sent(
-                        issue, "overdue", days_until_due, db
-                    )
+            recipients = [reminder.student_email for reminder in chunk]
+            messages = [self.reminder_context(reminder, today) for reminder in chunk]
 
-    # email boilerplates
-    def create_pre_due_reminder(
-        self, student_name: str, book_title: str, due_date: date, days_remaining: int
-    ) -> tuple[str, str]:
-        subject = f"Library Reminder: Book Due in {days_remaining} Days"
-
-        body = f"""
-        <html>
-        <body>
-            <h2>Library Book Reminder</h2>
-            <p>Dear {student_name},</p>
-            
-            <p>This is a friendly reminder that you have a book due soon:</p>
-            
-            <div style="background-color: #f0f8ff; padding: 15px; border-left: 4px solid #007bff;">
-                <strong>Book:</strong> {book_title}<br>
-                <strong>Due Date:</strong> {due_date.strftime('%B %d, %Y')}<br>
-                <strong>Days Remaining:</strong> {days_remaining}
-            </div>
-            
-            <p>Please return the book on or before the due date to avoid late fees.</p>
-            
-            <p>Thank you,<br>
-            University Library Team</p>
-        </body>
-        </html>
-        """
-
-        return subject, body
-
-    def create_overdue_reminder(
-        self, student_name: str, book_title: str, due_date: date, days_overdue: int
-    ) -> tuple[str, str]:
-        subject = f"URGENT: Overdue Book - {days_overdue} Days Late"
-
-        body = f"""
-        <html>
-        <body>
-            <h2 style="color: #dc3545;">Overdue Book Notice</h2>
-            <p>Dear {student_name},</p>
-            
-            <p><strong>Your book is now overdue. Please return it immediately.</strong></p>
-            
-            <div style="background-color: #fff3cd; padding: 15px; border-left: 4px solid #ffc107;">
-                <strong>Book:</strong> {book_title}<br>
-                <strong>Due Date:</strong> {due_date.strftime('%B %d, %Y')}<br>
-                <strong>Days Overdue:</strong> {days_overdue}
-            </div>
-            
-            <p>Please return the book to the library circulation desk as soon as possible.</p>
-            
-            <p>University Library Team</p>
-        </body>
-        </html>
-        """
-
-        return subject, body
+        return [
+            (to_email, *self.templates.render(name, context))
+            for to_email, (name, context) in zip(recipients, messages)
+        ]
 
 
 # email schedule service controller
 class ScheduleController:
-    def __init__(self, tracking_service: OverdueTrackingController):
+    # every app process runs a scheduler, so each job takes a postgres advisory lock
+    # first and only the process that gets it runs the job. reminder_partitions splits
+    # the reminder pass by student, one lock per partition, so several processes can
+    # share a large run
+    def __init__(
+        self,
+        tracking_service: OverdueTrackingController,
+        outbox_service: EmailOutboxController,
+        engine: AsyncEngine,
+        reminder_partitions: int = 1,
+    ):
         self.scheduler = AsyncIOScheduler()
         self.tracking_service = tracking_service
+        self.outbox_service = outbox_service
+        self.engine = engine
+        self.reminder_partitions = reminder_partitions
 
     def setup_scheduler(self):
         self.scheduler.add_job(
-            self.tracking_service.process_reminders,
+            self.run_reminders,
             CronTrigger(hour=0, minute=0),
             id="daily_reminder_check",
             replace_existing=True,
         )
+        self.scheduler.add_job(
+            self.run_outbox_dispatch,
+            IntervalTrigger(minutes=1),
+            id="email_outbox_dispatch",
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True,
+        )
+
+    # runs job only if no other process holds the named lock, None when skipped
+    async def run_exclusive(self, name: str, job: Callable, *args):
+        async with advisoryLock(self.engine, f"library:{name}") as acquired:
+            if not acquired:
+                print(f"{name} is running in another process, skipped.")
+                return None
+            return await job(*args)
+
+    # partitions are tried from a random start, so concurrent processes spread out
+    # over them instead of queueing for the first one. a partition finished by one
+    # process and then taken by another finds nothing left to remind
+    async def run_reminders(self) -> List[dict]:
+        partitions = self.reminder_partitions
+        start = random.randrange(partitions)
+        results = []
+        for offset in range(partitions):
+            partition = (start + offset) % partitions
+            result = await self.run_exclusive(
+                f"daily_reminder_check:{partition}/{partitions}",
+                self.tracking_service.process_reminders,
+                partition,
+                partitions,
+            )
+            if result is not None:
+                results.append({"partition": partition, **result})
+        return results
+
+    async def run_outbox_dispatch(self) -> Optional[dict]:
+        return await self.run_exclusive(
+            "email_outbox_dispatch", self.outbox_service.dispatch
+        )
 
     def start(self):
         self.scheduler.start()
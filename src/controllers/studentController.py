@@ -1,40 +1,243 @@
-from sqlalchemy import delete, select, update
+import re
+from fastapi import HTTPException
+from sqlalchemy import Select, String, any_, delete, insert, literal, or_, select, tuple_, update
+from sqlalchemy.dialects.postgresql import ARRAY, insert as pg_insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from schemas.student import StudentCreate
 from models.models import Student
-from typing import Optional, List
+from typing import AsyncIterator, Optional, List
+from datetime import datetime
+from utils.bulkImport import ImportReport, formatRowErrors
+from utils.entityCache import studentCache
+from utils.pagination import decodeCursor, encodeCursor
 
 
 # student controller
 # all functions names descriptive of their functions
 class StudentController:
     @staticmethod
-    async def getStudentById(db: AsyncSession, student_id: int) -> Optional[Student]:
+    async def getStudentById(
+        db: AsyncSession, student_id: int, cached: bool = True
+    ) -> Optional[Student]:
         try:
-            result = await db.execute(select(Student).where(Student.id == student_id))
-            return result.scalar_one_or_none()
+            if cached:
+                student = await studentCache.get(db, student_id)
+                if student is not None:
+                    return student
+
+            result = await db.execute(
+                select(Student)
+                .where(Student.id == student_id)
+                .execution_options(populate_existing=True)
+            )
+            student = result.scalar_one_or_none()
+            if student is not None:
+                studentCache.put(student)
+            return student
         except Exception as e:
             raise Exception(f"Error fetching book: {str(e)}")
 
+    @staticmethod
+    def exportQuery(updated_since: Optional[datetime] = None):
+        query = select(Student.__table__)
+        if updated_since:
+            query = query.where(Student.updated_at >= updated_since)
+        return query.order_by(Student.updated_at, Student.id)
+
     @staticmethod
     async def createStudent(db: AsyncSession, student_data: StudentCreate) -> Student:
         try:
-            new_student = Student(
-                name=student_data.name,
-                roll_number=student_data.roll_number,
-                department=student_data.department,
-                semester=student_data.semester,
-                phone=student_data.phone,
-                email=student_data.email,
+            result = await db.execute(
+                insert(Student)
+                .values(
+                    name=student_data.name,
+                    roll_number=student_data.roll_number,
+                    department=student_data.department,
+                    semester=student_data.semester,
+                    phone=student_data.phone,
+                    email=student_data.email,
+                )
+                .returning(Student)
             )
-            db.add(new_student)
+            new_student = result.scalar_one()
             await db.commit()
             return new_student
 
+        except IntegrityError:
+            await db.rollback()
+            raise HTTPException(
+                status_code=409,
+                detail="A student with this roll number or email already exists",
+            )
         except Exception as e:
             await db.rollback()
             raise Exception(f"Error Creating student: {str(e)}")
 
+    # validated batches are inserted with multi-row INSERT ... ON CONFLICT DO NOTHING, rows
+    # that hit an existing roll number or email are reported instead of failing the batch
+    @staticmethod
+    async def bulkImportStudents(
+        db: AsyncSession, batches: AsyncIterator[tuple[list, list, Optional[str]]]
+    ) -> ImportReport:
+        report = ImportReport()
+
+        async for valid_rows, row_errors, file_error in batches:
+            report.rows_received += len(valid_rows) + len(row_errors)
+            report.reject(row_errors)
+            report.file_error = file_error
+
+            # repeats within a batch are rejected up front so every skipped row is attributable
+            rows, roll_numbers, emails = [], set(), set()
+            for row_number, student in valid_rows:
+                duplicate_field = None
+                if student.roll_number in roll_numbers:
+                    duplicate_field = "roll_number"
+                elif student.email in emails:
+                    duplicate_field = "email"
+
+                if duplicate_field:
+                    report.reject(
+                        [
+                            {
+                                "row": row_number,
+                                "errors": [
+                                    {
+                                        "field": duplicate_field,
+                                        "message": f"Duplicate {duplicate_field} in upload",
+                                    }
+                                ],
+                            }
+                        ]
+                    )
+                    continue
+                roll_numbers.add(student.roll_number)
+                emails.add(student.email)
+                rows.append((row_number, student))
+            if not rows:
+                continue
+
+            try:
+                result = await db.execute(
+                    pg_insert(Student.__table__)
+                    .on_conflict_do_nothing()
+                    .returning(Student.roll_number),
+                    [student.model_dump() for _, student in rows],
+                )
+                inserted = set(result.scalars().all())
+
+                skipped = [
+                    (row_number, student)
+                    for row_number, student in rows
+                    if student.roll_number not in inserted
+                ]
+                conflicts = {}
+                if skipped:
+                    conflicts = await StudentController.findEnrollmentConflicts(
+                        db, [student for _, student in skipped]
+                    )
+                await db.commit()
+            except Exception as e:
+                await db.rollback()
+                report.reject(
+                    [
+                        formatRowErrors(row_number, Exception(f"Batch failed: {str(e)}"))
+                        for row_number, _ in rows
+                    ]
+                )
+                continue
+
+            report.rows_imported += len(rows) - len(skipped)
+            report.created += len(rows) - len(skipped)
+            report.reject(
+                [
+                    {
+                        "row": row_number,
+                        "errors": [
+                            {"field": field, "message": f"{field} already exists"}
+                            for field in conflicts.get(
+                                student.roll_number, ["roll_number", "email"]
+                            )
+                        ],
+                    }
+                    for row_number, student in skipped
+                ]
+            )
+
+        return report
+
+    # which unique fields of each student already belong to someone, keyed by roll number
+    @staticmethod
+    async def findEnrollmentConflicts(
+        db: AsyncSession, students: List[StudentCreate]
+    ) -> dict:
+        roll_numbers = [student.roll_number for student in students]
+        emails = [student.email for student in students]
+        result = await db.execute(
+            select(Student.roll_number, Student.email).where(
+                or_(
+                    Student.roll_number == any_(literal(roll_numbers, ARRAY(String))),
+                    Student.email == any_(literal(emails, ARRAY(String))),
+                )
+            )
+        )
+        existing = result.all()
+        taken_rolls = {roll_number for roll_number, _ in existing}
+        taken_emails = {email for _, email in existing}
+
+        conflicts = {}
+        for student in students:
+            fields = []
+            if student.roll_number in taken_rolls:
+                fields.append("roll_number")
+            if student.email in taken_emails:
+                fields.append("email")
+            conflicts[student.roll_number] = fields or ["roll_number", "email"]
+        return conflicts
+
+    # roll number and phone are prefix matches on the normalized value, as stored by
+    # StudentCreate. a phone filter without digits is rejected. results are ordered by
+    # (name, id) and paged with an after cursor
+    @staticmethod
+    def searchQuery(
+        department: Optional[str] = None,
+        semester: Optional[int] = None,
+        name: Optional[str] = None,
+        roll_number: Optional[str] = None,
+        phone: Optional[str] = None,
+        limit: int = 20,
+        after: Optional[str] = None,
+    ) -> Select:
+        query = select(Student)
+
+        if department:
+            filter = Student.department == department
+            query = query.where(filter)
+        if semester:
+            filter = Student.semester == semester
+            query = query.where(filter)
+        if name:
+            filter = Student.name.ilike(f"%{name.strip()}%")
+            query = query.where(filter)
+        if roll_number:
+            filter = Student.roll_number.startswith(
+                roll_number.strip().upper(), autoescape=True
+            )
+            query = query.where(filter)
+        if phone:
+            # an empty prefix would match every student
+            digits = re.sub(r"\D", "", phone)
+            if not digits:
+                raise ValueError("Phone filter must contain at least one digit")
+            filter = Student.phone.startswith(digits)
+            query = query.where(filter)
+
+        if after:
+            last_name, last_id = decodeCursor(after, str, int)
+            query = query.where(tuple_(Student.name, Student.id) > (last_name, last_id))
+
+        return query.order_by(Student.name, Student.id).limit(limit + 1)
+
     @staticmethod
     async def searchStudents(
         db: AsyncSession,
@@ -43,30 +246,31 @@ class StudentController:
         name: Optional[str] = None,
         roll_number: Optional[str] = None,
         phone: Optional[str] = None,
-    ) -> List[Student]:
+        limit: int = 20,
+        after: Optional[str] = None,
+    ) -> tuple[List[Student], bool, Optional[str]]:
         try:
-            query = select(Student)
-
-            if department:
-                filter = Student.department == department
-                query = query.where(filter)
-            if semester:
-                filter = Student.semester == semester
-                query = query.where(filter)
-            if name:
-                filter = Student.name.ilike(f"%{name}%")
-                query = query.where(filter)
-            if roll_number:
-                filter = Student.name.ilike(f"%{roll_number}%")
-                query = query.where(filter)
-            if phone:
-                filter = Student.name.ilike(f"%{phone}%")
-                query = query.where(filter)
-
+            query = StudentController.searchQuery(
+                department=department,
+                semester=semester,
+                name=name,
+                roll_number=roll_number,
+                phone=phone,
+                limit=limit,
+                after=after,
+            )
             result = await db.execute(query)
             students = result.scalars().all()
 
-            return students
+            has_next = len(students) > limit
+            students = students[:limit]
+            next_cursor = None
+            if has_next:
+                next_cursor = encodeCursor([students[-1].name, students[-1].id])
+
+            return students, has_next, next_cursor
 
+        except ValueError:
+            raise
         except Exception as e:
             raise Exception(f"Error searching students: {str(e)}")
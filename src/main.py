@@ -1,18 +1,35 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from routers.bookRouter import router as bookRouter
 from routers.studentRouter import router as studentRouter
 from routers.bookIssueRouter import router as bookIssueRouter
 from routers.overdueRouter import router as overdueRouter
 from routers.overdueRouter import lifespan
 from routers.aiRouter import router as aiRouter
+from routers.metricsRouter import router as metricsRouter
+from utils.roundTrips import RoundTripCounter, currentRoundTrips
 
 app = FastAPI(lifespan=lifespan)
 
+
+# reports how many statements each request sent to the database
+@app.middleware("http")
+async def count_db_round_trips(request: Request, call_next):
+    counter = RoundTripCounter()
+    token = currentRoundTrips.set(counter)
+    try:
+        response = await call_next(request)
+    finally:
+        currentRoundTrips.reset(token)
+    response.headers["X-DB-Round-Trips"] = str(counter.count)
+    return response
+
+
 app.include_router(bookRouter, prefix="/books", tags=["Books"])
 app.include_router(studentRouter, prefix="/students", tags=["Student"])
 app.include_router(bookIssueRouter, prefix="/book-issue", tags=["Book Management"])
 app.include_router(overdueRouter, prefix="/overdue", tags=["Overdue Management"])
 app.include_router(aiRouter, prefix="/ai", tags=["AI Assistant"])
+app.include_router(metricsRouter, prefix="/metrics", tags=["Metrics"])
 
 
 @app.get("/")
@@ -1,21 +1,217 @@
 # manage.py
 import typer
 import asyncio
+from datetime import date
+from typing import Optional
 from config.db import engine  # must be an AsyncEngine
-from models.models import Base
+from migrations import MIGRATIONS, applyMigrations, getAppliedVersions
+from utils.explain import explainQuery
 
 cli = typer.Typer()
 
 
 async def async_migrate():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-    print("Tables created.")
+    try:
+        applied = await applyMigrations(engine)
+    finally:
+        await engine.dispose()
+    print(f"{len(applied)} migration(s) applied." if applied else "Schema is up to date.")
 
 
 @cli.command("migrate")
 def migrate():
-    asyncio.run(async_migrate())
+    try:
+        asyncio.run(async_migrate())
+    except ValueError as e:
+        # data a migration cannot build over, nothing was applied for it
+        print(f"Migration stopped: {e}")
+        raise typer.Exit(1)
+
+
+# returns all but the oldest of the open loans a student holds for the same book, which
+# blocks the unique open loan index of migration 3
+@cli.command("close-duplicate-loans")
+def close_duplicate_loans():
+    from config.db import AsyncSessionLocal
+    from controllers.bookIssueController import BookIssueController
+
+    async def run():
+        try:
+            async with AsyncSessionLocal() as db:
+                return await BookIssueController.closeDuplicateOpenLoans(db)
+        finally:
+            await engine.dispose()
+
+    closed = asyncio.run(run())
+    print(f"Returned {len(closed)} duplicate loan(s): {closed}" if closed else "No duplicate loans.")
+
+
+@cli.command("migrations")
+def migrations():
+    async def run():
+        try:
+            return await getAppliedVersions(engine)
+        finally:
+            await engine.dispose()
+
+    applied = asyncio.run(run())
+    for migration in MIGRATIONS:
+        state = "applied" if migration.version in applied else "pending"
+        print(f"{migration.version:>4} [{state}] {migration.description}")
+
+
+# the queries behind the hot endpoints, built by the controllers with sample values
+def explainTargets(student_id: int, term: str) -> dict:
+    from controllers.bookController import BookController
+    from controllers.bookIssueController import BookIssueController
+    from controllers.overdueTrackingController import OverdueTrackingController
+    from controllers.studentController import StudentController
+
+    return {
+        "books.search.title": BookController.searchQuery(
+            BookController.buildSearchFilters(title=term)
+        ),
+        "books.search.relevance": BookController.searchQuery(
+            BookController.buildSearchFilters(q=term, fuzzy=True),
+            score=BookController.buildRelevanceScore(q=term),
+        ),
+        "students.search.name": StudentController.searchQuery(name=term),
+        "students.search.roll_number": StudentController.searchQuery(roll_number=term),
+        "book_issue.open_loans": BookIssueController.openLoansQuery(student_id),
+        "book_issue.loan_history": BookIssueController.loanHistoryQuery(student_id),
+        "book_issue.loan_history.archive": BookIssueController.loanHistoryQuery(
+            student_id, include_archive=True
+        ),
+        "book_issue.report.overdue": BookIssueController.reportQuery(
+            status="overdue", limit=1000
+        ),
+        "book_issue.report.archive": BookIssueController.reportQuery(
+            issued_from=date(date.today().year - 5, 1, 1),
+            issued_to=date(date.today().year - 5, 12, 31),
+            include_archive=True,
+            limit=1000,
+        ),
+        "reminders.candidates": OverdueTrackingController.books_needing_reminders_query(
+            date.today()
+        ),
+        "reminders.incremental": OverdueTrackingController.books_needing_reminders_query(
+            date.today(), scheduled=True
+        ),
+    }
+
+
+@cli.command("explain")
+def explain(
+    only: Optional[str] = typer.Option(None, help="Only queries whose name starts with this"),
+    analyze: bool = typer.Option(False, help="Run the queries and report actual timings"),
+    student_id: int = typer.Option(1, help="Student used by the loan queries"),
+    term: str = typer.Option("data", help="Search term used by the search queries"),
+):
+    async def run():
+        try:
+            async with engine.connect() as conn:
+                for name, query in explainTargets(student_id, term).items():
+                    if only and not name.startswith(only):
+                        continue
+                    print(f"== {name}")
+                    for line in await explainQuery(conn, query, analyze=analyze):
+                        print(f"   {line}")
+                    print()
+                await conn.rollback()
+        finally:
+            await engine.dispose()
+
+    asyncio.run(run())
+
+
+@cli.command("archive")
+def archive(
+    years: int = typer.Option(3, min=1, help="Archive loans returned more than this many years ago"),
+    batch_size: int = typer.Option(5000, min=1, help="Loans moved per transaction"),
+):
+    from controllers.archiveController import ArchiveController
+    from config.db import AsyncSessionLocal
+
+    today = date.today()
+    try:
+        returned_before = today.replace(year=today.year - years)
+    except ValueError:
+        # 29th of february
+        returned_before = today.replace(year=today.year - years, day=28)
+
+    async def run():
+        try:
+            async with AsyncSessionLocal() as db:
+                return await ArchiveController.archiveReturnedLoans(
+                    db, returned_before, batch_size
+                )
+        finally:
+            await engine.dispose()
+
+    loans, reminders = asyncio.run(run())
+    print(
+        f"Archived {loans} loans returned before {returned_before} "
+        f"and {reminders} of their reminders."
+    )
+
+
+@cli.command("bench-checkout")
+def bench_checkout(
+    requests: int = typer.Option(100, help="Parallel checkout requests"),
+    copies: int = typer.Option(10, help="Copies of the contended book"),
+):
+    from benchmarks.checkout import runCheckoutBenchmark
+
+    async def run():
+        try:
+            return await runCheckoutBenchmark(requests, copies)
+        finally:
+            await engine.dispose()
+
+    for result in asyncio.run(run()):
+        print(
+            f"{result['variant']:>6}: {result['issued']} issued, "
+            f"{result['rejected']} rejected, {result['failed']} failed, "
+            f"{result['loans']} loans for {copies} copies "
+            f"({result['oversold']} oversold, {result['copies_left']} left), "
+            f"{result['seconds']}s, {result['checkouts_per_second']} checkouts/s"
+        )
+
+
+@cli.command("bench-email")
+def bench_email(
+    messages: int = typer.Option(500, help="Messages to deliver"),
+    connections: int = typer.Option(8, help="SMTP sessions in the pool"),
+    latency_ms: float = typer.Option(5, help="Simulated delay before each SMTP reply"),
+):
+    from benchmarks.emailDelivery import runEmailBenchmark
+
+    results = asyncio.run(runEmailBenchmark(messages, connections, latency_ms))
+    for result in results:
+        print(
+            f"{result['variant']:>6}: {messages} messages in {result['seconds']}s, "
+            f"{result['messages_per_second']} messages/s, "
+            f"{result['connections_opened']} connections"
+        )
+    print(
+        f"speedup: {results[1]['messages_per_second'] / results[0]['messages_per_second']:.1f}x"
+    )
+
+
+@cli.command("bench-templates")
+def bench_templates(
+    messages: int = typer.Option(10000, help="Reminder emails to render"),
+):
+    from benchmarks.templateRendering import runTemplateBenchmark
+
+    compile_ms, results = runTemplateBenchmark(messages)
+    print(f"templates compiled once in {compile_ms}ms")
+    for result in results:
+        print(
+            f"{result['variant']:>8}: {messages} messages in {result['seconds']}s, "
+            f"{result['us_per_message']}us/message, "
+            f"{result['messages_per_second']} messages/s"
+        )
 
 
 @cli.command("test")
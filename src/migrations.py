@@ -0,0 +1,208 @@
+# versioned schema migrations, applied in order by manage.py migrate.
+# create_all only creates missing tables, so anything added to an existing table
+# (indexes, triggers, extensions) ships as a migration here. every step is idempotent,
+# a migration that failed half way can simply be run again
+import re
+from dataclasses import dataclass
+from typing import Awaitable, Callable, List
+
+from sqlalchemy import Index, select, text, update
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.schema import CreateIndex
+
+from controllers.bookIssueController import BookIssueController
+from models.models import (
+    Base,
+    BookIssue,
+    BookIssueArchive,
+    EmailOutbox,
+    ReminderHistoryArchive,
+    SchemaMigration,
+)
+from utils.reminderSchedule import REMINDER_WINDOW_DAYS
+
+
+@dataclass
+class Migration:
+    version: int
+    description: str
+    apply: Callable[[AsyncEngine], Awaitable[None]]
+
+
+def findIndex(name: str) -> Index:
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            if index.name == name:
+                return index
+    raise ValueError(f"Unknown index {name}")
+
+
+# CONCURRENTLY keeps the table writable while the index builds, but cannot run inside
+# a transaction. a failed concurrent build leaves an invalid index behind that
+# IF NOT EXISTS would skip, so that one is dropped first
+async def createIndexesConcurrently(engine: AsyncEngine, *names: str):
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        for name in names:
+            invalid = await conn.scalar(
+                text(
+                    "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                    "WHERE c.relname = :name AND NOT i.indisvalid"
+                ),
+                {"name": name},
+            )
+            if invalid:
+                await conn.exec_driver_sql(f'DROP INDEX CONCURRENTLY "{name}"')
+
+            ddl = str(
+                CreateIndex(findIndex(name), if_not_exists=True).compile(
+                    dialect=conn.dialect
+                )
+            )
+            await conn.exec_driver_sql(
+                re.sub(r"\bINDEX\b", "INDEX CONCURRENTLY", ddl, count=1)
+            )
+
+
+async def createSchema(engine: AsyncEngine):
+    async with engine.begin() as conn:
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        await conn.run_sync(Base.metadata.create_all)
+
+
+async def createSearchIndexes(engine: AsyncEngine):
+    await createIndexesConcurrently(
+        engine,
+        "ix_Books_title_id",
+        "ix_Books_title_trgm",
+        "ix_Books_author_trgm",
+        "ix_Books_category_trgm",
+        "ix_Books_search_vector",
+        "ix_Books_updated_at",
+        "ix_Students_name_id",
+        "ix_Students_roll_number_prefix",
+        "ix_Students_phone_prefix",
+        "ix_Students_name_trgm",
+        "ix_Students_updated_at",
+        "ix_BookIssues_updated_at",
+    )
+
+
+# the unique open loan index cannot be built while a student holds a book twice, and
+# a failed concurrent build would leave an invalid index behind on every rerun. the
+# duplicates are listed up front instead, so nothing is built until they are gone
+async def checkDuplicateOpenLoans(engine: AsyncEngine):
+    async with engine.connect() as conn:
+        result = await conn.execute(BookIssueController.duplicateOpenLoansQuery())
+        duplicates = result.all()
+    if duplicates:
+        listed = "; ".join(
+            f"book {row.book_id}, student {row.student_id}: issues {row.issue_ids}"
+            for row in duplicates
+        )
+        raise ValueError(
+            f"{len(duplicates)} book(s) are held more than once by the same student "
+            f"({listed}). Return the extra loans, or run "
+            f"`python src/manage.py close-duplicate-loans` to return all but the oldest, "
+            f"then migrate again"
+        )
+
+
+async def createOpenLoanIndexes(engine: AsyncEngine):
+    await checkDuplicateOpenLoans(engine)
+    await createIndexesConcurrently(
+        engine,
+        "uq_BookIssues_open_loan",
+        "ix_BookIssues_open_student_due_date",
+        "ix_BookIssues_open_due_date",
+        "ix_BookIssues_returned_student",
+        "ix_ReminderHistory_issue_type_sent_date",
+    )
+
+
+async def createArchiveTables(engine: AsyncEngine):
+    async with engine.begin() as conn:
+        await conn.run_sync(
+            Base.metadata.create_all,
+            tables=[BookIssueArchive.__table__, ReminderHistoryArchive.__table__],
+        )
+
+
+async def createEmailOutbox(engine: AsyncEngine):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all, tables=[EmailOutbox.__table__])
+
+
+# open loans are first reminded when they enter the pre due window. loans already in
+# it (or overdue) get a date in the past and are picked up by the next pass
+async def scheduleOpenLoanReminders(engine: AsyncEngine):
+    async with engine.begin() as conn:
+        await conn.execute(
+            text('ALTER TABLE "BookIssues" ADD COLUMN IF NOT EXISTS next_reminder_on DATE')
+        )
+        await conn.execute(
+            update(BookIssue)
+            .where(BookIssue.return_date.is_(None), BookIssue.next_reminder_on.is_(None))
+            .values(
+                next_reminder_on=BookIssue.due_date - REMINDER_WINDOW_DAYS,
+                updated_at=BookIssue.updated_at,
+            )
+        )
+    await createIndexesConcurrently(engine, "ix_BookIssues_open_next_reminder_on")
+
+
+# links each reminder to the email that carries it. rows written before this have no
+# link and are never released
+async def linkRemindersToOutbox(engine: AsyncEngine):
+    async with engine.begin() as conn:
+        await conn.execute(
+            text(
+                'ALTER TABLE "ReminderHistory" ADD COLUMN IF NOT EXISTS email_outbox_id '
+                'INTEGER REFERENCES "EmailOutbox" (id)'
+            )
+        )
+    await createIndexesConcurrently(engine, "ix_ReminderHistory_email_outbox_id")
+
+
+
+# reminder passes select on next_reminder_on since migration 7, the per partition
+# watermark no longer decided anything. migration 6 that created it is gone, this
+# removes the table where it was applied
+async def dropReminderWatermarks(engine: AsyncEngine):
+    async with engine.begin() as conn:
+        await conn.execute(text('DROP TABLE IF EXISTS "ReminderWatermarks"'))
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "pg_trgm extension, missing tables and facet triggers", createSchema),
+    Migration(2, "search, prefix and updated_at indexes", createSearchIndexes),
+    Migration(3, "open loan and reminder lookup indexes", createOpenLoanIndexes),
+    Migration(4, "partitioned archive of returned loans", createArchiveTables),
+    Migration(5, "email outbox", createEmailOutbox),
+    Migration(7, "reminder schedule of open loans", scheduleOpenLoanReminders),
+    Migration(8, "reminder history linked to outbox emails", linkRemindersToOutbox),
+    Migration(9, "drop reminder watermarks", dropReminderWatermarks),
+]
+
+
+async def getAppliedVersions(engine: AsyncEngine) -> set:
+    async with engine.begin() as conn:
+        await conn.run_sync(SchemaMigration.__table__.create, checkfirst=True)
+        result = await conn.execute(select(SchemaMigration.version))
+        return set(result.scalars().all())
+
+
+async def applyMigrations(engine: AsyncEngine) -> List[Migration]:
+    applied = await getAppliedVersions(engine)
+    pending = [m for m in MIGRATIONS if m.version not in applied]
+
+    for migration in pending:
+        print(f"Applying {migration.version}: {migration.description}")
+        await migration.apply(engine)
+        async with engine.begin() as conn:
+            await conn.execute(
+                SchemaMigration.__table__.insert().values(
+                    version=migration.version, description=migration.description
+                )
+            )
+    return pending
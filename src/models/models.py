@@ -1,4 +1,20 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Date, null
+from sqlalchemy import (
+    Column,
+    Integer,
+    String,
+    DateTime,
+    ForeignKey,
+    Text,
+    Date,
+    DDL,
+    Index,
+    cast,
+    func,
+    literal,
+    null,
+    event,
+)
+from sqlalchemy.dialects.postgresql import REGCONFIG
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime, date
@@ -17,14 +33,127 @@ class Book(Base):
     category = Column(String(256), nullable=False, index=True)
 
     created_at = Column(DateTime, default=datetime.now)
-    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+    updated_at = Column(
+        DateTime, default=datetime.now, onupdate=datetime.now, index=True
+    )
 
     issues = relationship("BookIssue", back_populates="book")
 
+    # (title, id) matches the search ordering so cursor pages are an index range scan.
+    # trigram indexes let substring (ilike '%term%') and fuzzy (%>) filters use an index
+    __table_args__ = (
+        Index("ix_Books_title_id", "title", "id"),
+        Index(
+            "ix_Books_title_trgm",
+            "title",
+            postgresql_using="gin",
+            postgresql_ops={"title": "gin_trgm_ops"},
+        ),
+        Index(
+            "ix_Books_author_trgm",
+            "author",
+            postgresql_using="gin",
+            postgresql_ops={"author": "gin_trgm_ops"},
+        ),
+        Index(
+            "ix_Books_category_trgm",
+            "category",
+            postgresql_using="gin",
+            postgresql_ops={"category": "gin_trgm_ops"},
+        ),
+    )
+
     def __repr__(self) -> str:
         return f"Book: title:{self.title}, isbn:{self.isbn}, copies:{self.number_of_copies}"
 
 
+# full text search document for books, title weighted above author and category.
+# the query side must use this exact expression for postgres to pick the GIN index,
+# so the literals are rendered inline instead of being sent as bound parameters
+SEARCH_CONFIG = cast(literal("simple", literal_execute=True), REGCONFIG)
+
+
+def bookSearchVector():
+    def weighted(column, weight: str):
+        return func.setweight(
+            func.to_tsvector(SEARCH_CONFIG, column),
+            literal(weight, literal_execute=True),
+        )
+
+    return (
+        weighted(Book.title, "A")
+        .op("||")(weighted(Book.author, "B"))
+        .op("||")(weighted(Book.category, "C"))
+    )
+
+
+Index("ix_Books_search_vector", bookSearchVector(), postgresql_using="gin")
+
+
+# number of books per (category, author), kept current by triggers on Books so the
+# search facets never have to scan Books
+class BookFacetCount(Base):
+    __tablename__ = "BookFacetCounts"
+
+    category = Column(String(256), primary_key=True)
+    author = Column(String(256), primary_key=True)
+    book_count = Column(Integer, nullable=False, default=0)
+
+
+BOOK_FACET_COUNTS_DDL = [
+    DDL(
+        """
+        CREATE OR REPLACE FUNCTION books_facet_counts_sync() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                UPDATE "BookFacetCounts" SET book_count = book_count - 1
+                WHERE category = OLD.category AND author = OLD.author;
+                DELETE FROM "BookFacetCounts"
+                WHERE category = OLD.category AND author = OLD.author AND book_count <= 0;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                INSERT INTO "BookFacetCounts" (category, author, book_count)
+                VALUES (NEW.category, NEW.author, 1)
+                ON CONFLICT (category, author)
+                DO UPDATE SET book_count = "BookFacetCounts".book_count + 1;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    ),
+    DDL(
+        """
+        CREATE OR REPLACE TRIGGER books_facet_counts_insert_delete
+        AFTER INSERT OR DELETE ON "Books"
+        FOR EACH ROW EXECUTE FUNCTION books_facet_counts_sync()
+        """
+    ),
+    DDL(
+        """
+        CREATE OR REPLACE TRIGGER books_facet_counts_update
+        AFTER UPDATE OF category, author ON "Books"
+        FOR EACH ROW
+        WHEN (OLD.category IS DISTINCT FROM NEW.category OR OLD.author IS DISTINCT FROM NEW.author)
+        EXECUTE FUNCTION books_facet_counts_sync()
+        """
+    ),
+    # backfill once, when the summary is created next to an existing catalog
+    DDL(
+        """
+        INSERT INTO "BookFacetCounts" (category, author, book_count)
+        SELECT category, author, count(*) FROM "Books"
+        WHERE NOT EXISTS (SELECT 1 FROM "BookFacetCounts")
+        GROUP BY category, author
+        """
+    ),
+]
+
+# runs after every create_all, once both tables exist. every statement is idempotent
+for ddl in BOOK_FACET_COUNTS_DDL:
+    event.listen(Base.metadata, "after_create", ddl.execute_if(dialect="postgresql"))
+
+
 class Student(Base):
     __tablename__ = "Students"
 
@@ -37,10 +166,34 @@ class Student(Base):
     email = Column(String(256), unique=True, nullable=False)
 
     created_at = Column(DateTime, default=datetime.now)
-    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+    updated_at = Column(
+        DateTime, default=datetime.now, onupdate=datetime.now, index=True
+    )
 
     issues = relationship("BookIssue", back_populates="student")
 
+    # (name, id) matches the search ordering for cursor pages. pattern_ops indexes serve
+    # prefix (LIKE 'abc%') lookups whatever the database collation, trigram serves name search
+    __table_args__ = (
+        Index("ix_Students_name_id", "name", "id"),
+        Index(
+            "ix_Students_roll_number_prefix",
+            "roll_number",
+            postgresql_ops={"roll_number": "varchar_pattern_ops"},
+        ),
+        Index(
+            "ix_Students_phone_prefix",
+            "phone",
+            postgresql_ops={"phone": "varchar_pattern_ops"},
+        ),
+        Index(
+            "ix_Students_name_trgm",
+            "name",
+            postgresql_using="gin",
+            postgresql_ops={"name": "gin_trgm_ops"},
+        ),
+    )
+
     def __repr__(self) -> str:
         return f"Student: name:{self.name}, roll:{self.roll_number}"
 
@@ -58,12 +211,56 @@ class BookIssue(Base):
     return_date = Column(Date, nullable=True)
     # return date if null means book is not returned yet
 
+    # the day the next reminder of an open loan is due, moved on by each reminder pass
+    next_reminder_on = Column(Date, nullable=True)
+
     created_at = Column(DateTime, default=datetime.now)
-    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+    updated_at = Column(
+        DateTime, default=datetime.now, onupdate=datetime.now, index=True
+    )
 
     book = relationship("Book", back_populates="issues")
     student = relationship("Student", back_populates="issues")
 
+    __table_args__ = (
+        # a student can hold only one open loan of the same book. also serves open
+        # loan lookups by book
+        Index(
+            "uq_BookIssues_open_loan",
+            "book_id",
+            "student_id",
+            unique=True,
+            postgresql_where=return_date.is_(None),
+        ),
+        # open loans of a student, soonest due first
+        Index(
+            "ix_BookIssues_open_student_due_date",
+            "student_id",
+            "due_date",
+            postgresql_where=return_date.is_(None),
+        ),
+        # reminder scans over open loans by due date
+        Index(
+            "ix_BookIssues_open_due_date",
+            "due_date",
+            postgresql_where=return_date.is_(None),
+        ),
+        # open loans a scheduled reminder pass has to look at
+        Index(
+            "ix_BookIssues_open_next_reminder_on",
+            "next_reminder_on",
+            postgresql_where=return_date.is_(None),
+        ),
+        # a student's returned loans, most recently returned first
+        Index(
+            "ix_BookIssues_returned_student",
+            "student_id",
+            return_date.desc(),
+            id.desc(),
+            postgresql_where=return_date.is_not(None),
+        ),
+    )
+
     @property
     def is_overdue(self):
         if self.return_date is None and self.due_date < date.today():
@@ -85,5 +282,105 @@ class ReminderHistory(Base):
     reminder_type = Column(String(50), nullable=False)
     sent_date = Column(Date, nullable=False, default=date.today)
     days_before_due = Column(Integer, nullable=False)
+    # the queued email carrying the reminder, a digest carries several. the row is
+    # deleted if that email is dead lettered, so the reminder counts as not sent
+    email_outbox_id = Column(Integer, ForeignKey("EmailOutbox.id"), nullable=True)
+
+    created_at = Column(DateTime, default=datetime.now)
+
+    __table_args__ = (
+        # has this reminder already gone out for the loan today
+        Index(
+            "ix_ReminderHistory_issue_type_sent_date",
+            "book_issue_id",
+            "reminder_type",
+            "sent_date",
+        ),
+        Index(
+            "ix_ReminderHistory_email_outbox_id",
+            "email_outbox_id",
+            postgresql_where=email_outbox_id.is_not(None),
+        ),
+    )
+
+
+# returned loans moved out of BookIssues by manage.py archive, range partitioned by
+# academic year of issue_date. the partition key has to be part of the primary key
+class BookIssueArchive(Base):
+    __tablename__ = "BookIssuesArchive"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    issue_date = Column(Date, primary_key=True)
+
+    book_id = Column(Integer, ForeignKey("Books.id"), nullable=False)
+    student_id = Column(Integer, ForeignKey("Students.id"), nullable=False)
+
+    due_date = Column(Date, nullable=False)
+    return_date = Column(Date, nullable=False)
+
+    created_at = Column(DateTime)
+    updated_at = Column(DateTime)
+    archived_at = Column(DateTime, default=datetime.now)
+
+    __table_args__ = (
+        Index("ix_BookIssuesArchive_student_id", "student_id"),
+        {"postgresql_partition_by": "RANGE (issue_date)"},
+    )
+
+
+# reminders of archived loans, moved together with their loan
+class ReminderHistoryArchive(Base):
+    __tablename__ = "ReminderHistoryArchive"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+
+    student_id = Column(Integer, nullable=False)
+    book_issue_id = Column(Integer, nullable=False, index=True)
+
+    reminder_type = Column(String(50), nullable=False)
+    sent_date = Column(Date, nullable=False)
+    days_before_due = Column(Integer, nullable=False)
+
+    created_at = Column(DateTime)
+
+
+# rendered emails waiting for delivery. the reminder pass fills it, the outbox
+# dispatcher claims pending rows, sends them and retries failures with backoff until
+# they are sent or dead
+class EmailOutbox(Base):
+    __tablename__ = "EmailOutbox"
+
+    id = Column(Integer, primary_key=True, index=True)
+
+    to_email = Column(String(256), nullable=False)
+    subject = Column(String(512), nullable=False)
+    body = Column(Text, nullable=False)
+
+    # pending, sending, sent or dead
+    status = Column(String(20), nullable=False, default="pending")
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.now)
+    claimed_at = Column(DateTime, nullable=True)
+    sent_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
 
     created_at = Column(DateTime, default=datetime.now)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+    __table_args__ = (
+        # rows the dispatcher can claim, oldest due first
+        Index(
+            "ix_EmailOutbox_deliverable",
+            "next_attempt_at",
+            postgresql_where=status.in_(["pending", "sending"]),
+        ),
+    )
+
+
+# versions applied by manage.py migrate
+class SchemaMigration(Base):
+    __tablename__ = "SchemaMigrations"
+
+    version = Column(Integer, primary_key=True, autoincrement=False)
+    description = Column(String(256), nullable=False)
+    applied_at = Column(DateTime, default=datetime.now)
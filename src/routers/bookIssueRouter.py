@@ -1,8 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from controllers.bookIssueController import BookIssueController
 from schemas.bookIssue import (
+    BookIssueBatchRequest,
+    BookIssueRead,
     BookIssueRequest,
+    BookReturnBatchRequest,
     BookReturnRequest,
     BookIssueResponse,
     IssuedBooksResponse,
@@ -10,7 +14,14 @@ from schemas.bookIssue import (
 )
 from schemas.book import BookRead
 from config.db import get_db
-from typing import Optional
+from typing import Literal, Optional
+from datetime import date, datetime
+from utils.streaming import (
+    EXPORT_FORMATS,
+    EXPORT_HEADERS,
+    serverTime,
+    streamRows,
+)
 
 router = APIRouter()
 
@@ -51,25 +62,151 @@ async def return_book(
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.get("/student/{student_id}", response_model=dict, status_code=201)
-async def get_books_issued_to_student(
-    student_id: int, db: AsyncSession = Depends(get_db)
+@router.post("/batch", response_model=dict, status_code=201)
+async def issue_books_batch(
+    batch: BookIssueBatchRequest, db: AsyncSession = Depends(get_db)
 ):
     try:
-        books_issued = await BookIssueController.getBooksIssuedToStudent(db, student_id)
-        return {"books": books_issued}
+        results = await BookIssueController.issueBooks(db, batch)
+        issued = sum(result.status == "issued" for result in results)
+        return {
+            "message": f"{issued} of {len(results)} books issued",
+            "issued_to_student": batch.student_id,
+            "issued": issued,
+            "failed": len(results) - issued,
+            "results": results,
+        }
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/return/batch", response_model=dict, status_code=201)
+async def return_books_batch(
+    batch: BookReturnBatchRequest, db: AsyncSession = Depends(get_db)
+):
+    try:
+        results = await BookIssueController.returnBooks(db, batch)
+        returned = sum(result.status == "returned" for result in results)
+        return {
+            "message": f"{returned} of {len(results)} books returned",
+            "returned": returned,
+            "failed": len(results) - returned,
+            "results": results,
+        }
+
     except HTTPException:
         raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.get("/", response_model=dict, status_code=201)
-async def get_book_issue_report(db: AsyncSession = Depends(get_db)):
+@router.get("/student/{student_id}", response_model=dict, status_code=201)
+async def get_books_issued_to_student(
+    student_id: int,
+    history: bool = Query(False, description="Also return returned loans"),
+    history_limit: int = Query(
+        20, ge=1, le=100, description="Returned loans per page"
+    ),
+    history_after: Optional[str] = Query(
+        None, description="Cursor from a previous response's history next_cursor"
+    ),
+    history_include_archive: bool = Query(
+        False, description="Also return returned loans moved to the archive"
+    ),
+    db: AsyncSession = Depends(get_db),
+):
     try:
-        books_issued = await BookIssueController.getBookIssueReport(db)
-        return {"books": books_issued}
+        books_issued = await BookIssueController.getBooksIssuedToStudent(db, student_id)
+        response = {"books": books_issued}
+
+        if history:
+            loans, next_cursor = await BookIssueController.getStudentLoanHistory(
+                db,
+                student_id,
+                limit=history_limit,
+                after=history_after,
+                include_archive=history_include_archive,
+            )
+            response["history"] = {
+                "loans": loans,
+                "pagination": {
+                    "per_page": history_limit,
+                    "has_next": next_cursor is not None,
+                    "next_cursor": next_cursor,
+                },
+            }
+
+        return response
     except HTTPException:
         raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/")
+async def get_book_issue_report(
+    issued_from: Optional[date] = Query(
+        None, description="Only loans issued on or after this date"
+    ),
+    issued_to: Optional[date] = Query(
+        None, description="Only loans issued on or before this date"
+    ),
+    status: Optional[Literal["open", "returned", "overdue"]] = Query(
+        None, description="Only open, returned or overdue (open and past due) loans"
+    ),
+    department: Optional[str] = Query(None, description="Student department"),
+    category: Optional[str] = Query(None, description="Book category"),
+    limit: Optional[int] = Query(
+        None, ge=1, le=100000, description="Rows per page, everything when omitted"
+    ),
+    after: Optional[str] = Query(
+        None, description="Cursor from the complete line of the previous page"
+    ),
+    include_archive: bool = Query(
+        False, description="Also report returned loans moved to the archive"
+    ),
+):
+    try:
+        query = BookIssueController.reportQuery(
+            issued_from=issued_from,
+            issued_to=issued_to,
+            status=status,
+            department=department,
+            category=category,
+            after=after,
+            limit=limit,
+            include_archive=include_archive,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return StreamingResponse(
+        BookIssueController.streamIssueReport(query, limit=limit),
+        media_type=EXPORT_FORMATS["ndjson"],
+        headers=EXPORT_HEADERS,
+    )
+
+
+@router.get("/export")
+async def export_book_issues(
+    format: Literal["ndjson", "csv"] = Query("ndjson", description="Output format"),
+    updated_since: Optional[datetime] = Query(
+        None, description="Only book issues created or updated at or after this time"
+    ),
+):
+    # converted before the response starts, see serverTime
+    query = BookIssueController.exportQuery(serverTime(updated_since))
+    return StreamingResponse(
+        streamRows(query, BookIssueRead, format),
+        media_type=EXPORT_FORMATS[format],
+        headers=EXPORT_HEADERS,
+    )
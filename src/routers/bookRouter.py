@@ -1,9 +1,28 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import (
+    APIRouter,
+    Depends,
+    File,
+    Header,
+    HTTPException,
+    Query,
+    Response,
+    UploadFile,
+)
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from controllers.bookController import BookController
-from schemas.book import BookCreate, BookRead, BookUpdate
+from schemas.book import BookBatchRequest, BookCreate, BookRead, BookUpdate
 from config.db import get_db
-from typing import Optional
+from utils.bulkImport import detectFormat, iterValidatedBatches
+from utils.etag import bookEtag, collectionEtag, etagMatches
+from utils.streaming import (
+    EXPORT_FORMATS,
+    EXPORT_HEADERS,
+    serverTime,
+    streamRows,
+)
+from typing import Literal, Optional
+from datetime import datetime
 
 router = APIRouter()
 
@@ -22,8 +41,75 @@ async def create_book(book_data: BookCreate, db: AsyncSession = Depends(get_db))
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/bulk", response_model=dict, status_code=201)
+async def bulk_import_books(
+    file: UploadFile = File(..., description="CSV with a header row, or NDJSON"),
+    format: Optional[Literal["csv", "ndjson"]] = Query(
+        None, description="File format, detected from the file name when omitted"
+    ),
+    batch_size: int = Query(1000, ge=1, le=10000, description="Rows per batch"),
+    db: AsyncSession = Depends(get_db),
+):
+    try:
+        batches = iterValidatedBatches(
+            file, detectFormat(file.filename, format), BookCreate, batch_size
+        )
+        report = await BookController.bulkImportBooks(db, batches)
+        return {
+            "message": (
+                "bulk import stopped early" if report.file_error else "bulk import completed"
+            ),
+            "rows_received": report.rows_received,
+            "rows_imported": report.rows_imported,
+            "books_created": report.created,
+            "books_updated": report.updated,
+            "rows_rejected": report.rows_rejected,
+            "errors": report.errors,
+            "errors_truncated": report.errors_truncated,
+            "file_error": report.file_error,
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/batch", response_model=dict)
+async def get_books_batch(
+    batch_request: BookBatchRequest, db: AsyncSession = Depends(get_db)
+):
+    try:
+        by_id, by_isbn = await BookController.getBooksByIdsOrIsbns(
+            db, batch_request.ids, batch_request.isbns
+        )
+
+        # results follow the request order, ids first and then isbns
+        books, seen = [], set()
+        missing = {"ids": [], "isbns": []}
+        for requested_keys, lookup, missing_keys in (
+            (batch_request.ids, by_id, missing["ids"]),
+            (batch_request.isbns, by_isbn, missing["isbns"]),
+        ):
+            for requested in requested_keys:
+                book = lookup.get(requested)
+                if book is None:
+                    missing_keys.append(requested)
+                elif book.id not in seen:
+                    seen.add(book.id)
+                    books.append(BookRead.model_validate(book).model_dump())
+
+        return {
+            "message": "Books fetched successfully",
+            "books": books,
+            "missing": missing,
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get("/search", response_model=dict)
 async def search_books(
+    response: Response,
     title: Optional[str] = Query(
         None, description="Filter by book title (partial match)"
     ),
@@ -33,40 +119,145 @@ async def search_books(
     category: Optional[str] = Query(
         None, description="Filter by book category (partial match)"
     ),
+    q: Optional[str] = Query(
+        None, description="Full text search across title, author and category"
+    ),
+    sort: Literal["title", "relevance"] = Query(
+        "title",
+        description="Order by title, or by relevance (also enables typo tolerant matching)",
+    ),
     page: int = Query(1, ge=1, description="Page number (starts from 1)"),
     limit: int = Query(10, ge=1, le=100, description="Number of books per page"),
+    after: Optional[str] = Query(
+        None,
+        description="Cursor from a previous response's next_cursor, replaces page",
+    ),
+    count: Literal["exact", "estimate", "none"] = Query(
+        "exact",
+        description="How total_items is computed: exact COUNT(*), planner estimate, or skipped",
+    ),
+    facets: bool = Query(
+        False, description="Include category and author counts for the filters"
+    ),
+    facet_limit: int = Query(
+        20, ge=1, le=100, description="Number of values returned per facet"
+    ),
+    if_none_match: Optional[str] = Header(None),
     db: AsyncSession = Depends(get_db),
 ):
     try:
-        books, total_count = await BookController.searchBooks(
-            db, title=title, author=author, category=category, page=page, limit=limit
+        books, total_count, has_next, next_cursor = await BookController.searchBooks(
+            db,
+            title=title,
+            author=author,
+            category=category,
+            q=q,
+            sort=sort,
+            page=page,
+            limit=limit,
+            after=after,
+            count=count,
         )
 
-        total_pages = (total_count + limit - 1) // limit
+        facet_counts = None
+        if facets:
+            facet_counts = await BookController.getSearchFacets(
+                db,
+                title=title,
+                author=author,
+                category=category,
+                q=q,
+                sort=sort,
+                facet_limit=facet_limit,
+            )
 
-        return {
+        etag = collectionEtag(
+            (
+                title,
+                author,
+                category,
+                q,
+                sort,
+                page,
+                limit,
+                after,
+                count,
+                total_count,
+                facet_counts,
+            ),
+            books,
+        )
+        if etagMatches(if_none_match, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        response.headers["ETag"] = etag
+
+        total_pages = None
+        if total_count is not None:
+            total_pages = (total_count + limit - 1) // limit
+
+        response_body = {
             "message": "Search completed successfully",
             "pagination": {
-                "current_page": page,
+                "current_page": None if after else page,
                 "per_page": limit,
                 "total_items": total_count,
+                "total_is_estimate": count == "estimate",
                 "total_pages": total_pages,
-                "has_next": page < total_pages,
-                "has_previous": page > 1,
+                "has_next": has_next,
+                "has_previous": after is not None or page > 1,
+                "next_cursor": next_cursor,
             },
             "books": [BookRead.model_validate(book).model_dump() for book in books],
         }
+        if facet_counts is not None:
+            response_body["facets"] = facet_counts
+        return response_body
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/export")
+async def export_books(
+    format: Literal["ndjson", "csv"] = Query("ndjson", description="Output format"),
+    updated_since: Optional[datetime] = Query(
+        None, description="Only books created or updated at or after this time"
+    ),
+):
+    # converted before the response starts, see serverTime
+    query = BookController.exportQuery(serverTime(updated_since))
+    return StreamingResponse(
+        streamRows(query, BookRead, format),
+        media_type=EXPORT_FORMATS[format],
+        headers=EXPORT_HEADERS,
+    )
+
+
 @router.get("/{book_id}", response_model=dict, status_code=200)
-async def get_book_by_id(book_id: int, db: AsyncSession = Depends(get_db)):
+async def get_book_by_id(
+    book_id: int,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db),
+):
     try:
-        book = await BookController.getBookById(db, book_id)
+        # a client holding a copy only needs the version to know it is still current
+        if if_none_match:
+            exists, version = await BookController.getBookVersion(db, book_id)
+            if not exists:
+                raise HTTPException(status_code=404, detail="Book not found")
+            etag = bookEtag(book_id, version)
+            if etagMatches(if_none_match, etag):
+                return Response(status_code=304, headers={"ETag": etag})
+
+        # read from the database, not the cache: the etag has to match what the
+        # version probe above will see, and a cached copy can lag it on any worker
+        book = await BookController.getBookById(db, book_id, cached=False)
         if not book:
             raise HTTPException(status_code=404, detail="Book not found")
 
+        response.headers["ETag"] = bookEtag(book.id, book.updated_at)
         return BookRead.model_validate(book).model_dump()
 
     except HTTPException:
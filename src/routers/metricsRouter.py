@@ -0,0 +1,28 @@
+from fastapi import APIRouter, HTTPException, Request
+from utils.entityCache import bookCache, studentCache
+
+router = APIRouter()
+
+
+@router.get("/cache", response_model=dict)
+async def get_cache_stats():
+    return {
+        "books": bookCache.stats(),
+        "students": studentCache.stats(),
+    }
+
+
+@router.get("/email", response_model=dict)
+async def get_email_stats(request: Request):
+    email_service = getattr(request.app.state, "email_service", None)
+    if email_service is None:
+        raise HTTPException(status_code=503, detail="Email service is not available")
+    return email_service.pool.stats()
+
+
+@router.get("/reminders", response_model=dict)
+async def get_reminder_dedup_stats(request: Request):
+    tracking_service = getattr(request.app.state, "tracking_service", None)
+    if tracking_service is None:
+        raise HTTPException(status_code=503, detail="Reminder service is not available")
+    return tracking_service.sent_today.stats()
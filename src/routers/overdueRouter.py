@@ -1,8 +1,9 @@
-from fastapi import FastAPI, APIRouter, BackgroundTasks, HTTPException, Depends
-from config.db import get_db
+from fastapi import FastAPI, APIRouter, BackgroundTasks, HTTPException, Depends, Request
+from config.db import engine, get_db
 from sqlalchemy.ext.asyncio import AsyncSession
 from controllers.overdueTrackingController import (
     EmailController,
+    EmailOutboxController,
     OverdueTrackingController,
     ScheduleController,
 )
@@ -27,9 +28,26 @@ async def lifespan(app: FastAPI):
 
         # initialize services
         email_service = EmailController(email_config)
-        tracking_service = OverdueTrackingController(email_service, get_db)
+        # digest: one email per student listing all of their due and overdue books.
+        # incremental: only loans that crossed a reminder threshold since the last
+        # pass, overdue loans are reminded again every overdue_cadence_days
+        tracking_service = OverdueTrackingController(
+            email_service,
+            get_db,
+            digest=True,
+            incremental=True,
+            overdue_cadence_days=7,
+        )
         await tracking_service.init()
-        scheduler_service = ScheduleController(tracking_service)
+        # reminders of dead lettered emails are released from this process's index
+        outbox_service = EmailOutboxController(
+            email_service, get_db, reminder_index=tracking_service.sent_today
+        )
+        # every process runs the scheduler, advisory locks let one of them run each job.
+        # raise reminder_partitions to split the reminder pass across processes
+        scheduler_service = ScheduleController(
+            tracking_service, outbox_service, engine, reminder_partitions=1
+        )
 
         # start the scheduler
         scheduler_service.setup_scheduler()
@@ -37,6 +55,7 @@ async def lifespan(app: FastAPI):
 
         app.state.email_service = email_service
         app.state.tracking_service = tracking_service
+        app.state.outbox_service = outbox_service
         app.state.scheduler_service = scheduler_service
 
         print("Overdue tracking system started successfully")
@@ -51,6 +70,8 @@ async def lifespan(app: FastAPI):
     try:
         if hasattr(app.state, "scheduler_service"):
             app.state.scheduler_service.stop()
+        if hasattr(app.state, "email_service"):
+            await app.state.email_service.close()
         print("Overdue tracking system stopped ")
     except Exception as e:
         print(f"Error during shutdown: {str(e)}")
@@ -62,14 +83,16 @@ async def trigger_manual_reminders(background_tasks: BackgroundTasks):
     try:
         from main import app
 
-        if not hasattr(app.state, "tracking_service"):
+        if not hasattr(app.state, "scheduler_service"):
             raise HTTPException(
                 status_code=503, detail="Overdue tracking service is not available"
             )
 
-        tracking_service = app.state.tracking_service
+        # same locks as the scheduled jobs, so a manual run never overlaps them
+        scheduler_service = app.state.scheduler_service
 
-        background_tasks.add_task(tracking_service.process_reminders)
+        background_tasks.add_task(scheduler_service.run_reminders)
+        background_tasks.add_task(scheduler_service.run_outbox_dispatch)
 
         return {
             "message": "Manual reminder processing started, reminders will be processed in the background",
@@ -80,3 +103,38 @@ async def trigger_manual_reminders(background_tasks: BackgroundTasks):
         raise HTTPException(
             status_code=500, detail=f"Failed to trigger reminders: {str(e)}"
         )
+
+
+# queued, in flight, sent and dead lettered reminder emails
+@router.get("/outbox", response_model=dict)
+async def get_outbox_stats(db: AsyncSession = Depends(get_db)):
+    try:
+        return await EmailOutboxController.get_stats(db)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# retry dead lettered emails, e.g. after fixing the smtp configuration
+@router.post("/outbox/requeue-dead", response_model=dict)
+async def requeue_dead_emails(db: AsyncSession = Depends(get_db)):
+    try:
+        requeued = await EmailOutboxController.requeue_dead(db)
+        return {"message": f"{requeued} dead emails requeued", "requeued": requeued}
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# recompile the reminder templates after editing them, no restart needed
+@router.post("/templates/reload", response_model=dict)
+async def reload_reminder_templates(request: Request):
+    tracking_service = getattr(request.app.state, "tracking_service", None)
+    if tracking_service is None:
+        raise HTTPException(
+            status_code=503, detail="Overdue tracking service is not available"
+        )
+    try:
+        tracking_service.templates.reload()
+        return {"message": "Reminder templates reloaded"}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to reload templates: {str(e)}")
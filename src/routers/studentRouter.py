@@ -1,10 +1,29 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import (
+    APIRouter,
+    Depends,
+    File,
+    Header,
+    HTTPException,
+    Query,
+    Response,
+    UploadFile,
+)
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from controllers.studentController import StudentController
 from schemas.book import BookCreate, BookRead, BookUpdate
 from schemas.student import StudentCreate, StudentRead
 from config.db import get_db
-from typing import Optional
+from typing import Literal, Optional
+from datetime import datetime
+from utils.bulkImport import detectFormat, iterValidatedBatches
+from utils.etag import collectionEtag, etagMatches
+from utils.streaming import (
+    EXPORT_FORMATS,
+    EXPORT_HEADERS,
+    serverTime,
+    streamRows,
+)
 
 router = APIRouter()
 
@@ -20,6 +39,39 @@ async def create_student(
             "student": StudentRead.model_validate(new_student).model_dump(),
         }
 
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/bulk", response_model=dict, status_code=201)
+async def bulk_enroll_students(
+    file: UploadFile = File(..., description="CSV with a header row, or NDJSON"),
+    format: Optional[Literal["csv", "ndjson"]] = Query(
+        None, description="File format, detected from the file name when omitted"
+    ),
+    batch_size: int = Query(1000, ge=1, le=10000, description="Rows per batch"),
+    db: AsyncSession = Depends(get_db),
+):
+    try:
+        batches = iterValidatedBatches(
+            file, detectFormat(file.filename, format), StudentCreate, batch_size
+        )
+        report = await StudentController.bulkImportStudents(db, batches)
+        return {
+            "message": (
+                "bulk enrollment stopped early" if report.file_error else "bulk enrollment completed"
+            ),
+            "rows_received": report.rows_received,
+            "students_created": report.created,
+            "rows_rejected": report.rows_rejected,
+            "errors": report.errors,
+            "errors_truncated": report.errors_truncated,
+            "file_error": report.file_error,
+        }
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -28,32 +80,71 @@ async def create_student(
 
 @router.get("/search", response_model=dict)
 async def search_students(
+    response: Response,
     department: Optional[str] = Query(None, description="Filter by department"),
     semester: Optional[int] = Query(None, description="Filter by semester"),
     name: Optional[str] = Query(None, description="Filter by name (partial match)"),
     roll_number: Optional[str] = Query(
-        None, description="Filter by roll number (partial match)"
+        None, description="Filter by roll number (prefix match)"
     ),
     phone: Optional[str] = Query(
-        None, description="Filter by phone number (partial match)"
+        None, description="Filter by phone number (prefix match)"
+    ),
+    limit: int = Query(20, ge=1, le=100, description="Number of students per page"),
+    after: Optional[str] = Query(
+        None, description="Cursor from a previous response's next_cursor"
     ),
+    if_none_match: Optional[str] = Header(None),
     db: AsyncSession = Depends(get_db),
 ):
     try:
-        students = await StudentController.searchStudents(
+        students, has_next, next_cursor = await StudentController.searchStudents(
             db,
             department=department,
             semester=semester,
             name=name,
             roll_number=roll_number,
             phone=phone,
+            limit=limit,
+            after=after,
         )
 
+        etag = collectionEtag(
+            (department, semester, name, roll_number, phone, limit, after), students
+        )
+        if etagMatches(if_none_match, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        response.headers["ETag"] = etag
+
         return {
             "message": "Search completed successfully",
+            "pagination": {
+                "per_page": limit,
+                "has_next": has_next,
+                "has_previous": after is not None,
+                "next_cursor": next_cursor,
+            },
             "students": [
                 StudentRead.model_validate(student).model_dump() for student in students
             ],
         }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/export")
+async def export_students(
+    format: Literal["ndjson", "csv"] = Query("ndjson", description="Output format"),
+    updated_since: Optional[datetime] = Query(
+        None, description="Only students created or updated at or after this time"
+    ),
+):
+    # converted before the response starts, see serverTime
+    query = StudentController.exportQuery(serverTime(updated_since))
+    return StreamingResponse(
+        streamRows(query, StudentRead, format),
+        media_type=EXPORT_FORMATS[format],
+        headers=EXPORT_HEADERS,
+    )
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr, validator, field_validator
+from pydantic import BaseModel, EmailStr, validator, field_validator, model_validator
 from typing import Optional, List
 from datetime import datetime
 import re
@@ -139,6 +139,35 @@ class BookUpdate(BaseModel):
         return v
 
 
+MAX_BATCH_SIZE = 500
+
+
+class BookBatchRequest(BaseModel):
+    ids: List[int] = []
+    isbns: List[str] = []
+
+    @field_validator("ids")
+    @classmethod
+    def validate_ids(cls, v):
+        if any(book_id <= 0 for book_id in v):
+            raise ValueError("Book IDs must be positive integers")
+        return v
+
+    @field_validator("isbns")
+    @classmethod
+    def validate_isbns(cls, v):
+        return [isbn.strip() for isbn in v]
+
+    @model_validator(mode="after")
+    def validate_batch_size(self):
+        requested = len(self.ids) + len(self.isbns)
+        if requested == 0:
+            raise ValueError("Provide at least one book id or ISBN")
+        if requested > MAX_BATCH_SIZE:
+            raise ValueError(f"Cannot fetch more than {MAX_BATCH_SIZE} books at once")
+        return self
+
+
 class BookRead(BaseModel):
     id: int
     title: str
@@ -1,10 +1,32 @@
-from pydantic import BaseModel, field_validator, model_validator
-from typing import Optional
+from pydantic import BaseModel, Field, field_validator, model_validator
+from typing import List, Optional
 from datetime import datetime, date, timedelta
 from .student import StudentRead
 from .book import BookRead
 
 
+MAX_BASKET_SIZE = 50
+
+
+def setIssueDates(data: dict) -> dict:
+    # issue date
+    issue_date = data.get("issue_date")
+    if issue_date is None:
+        issue_date = date.today()
+
+    # due date
+    due_date = data.get("due_date")
+    if due_date is None:
+        due_date = issue_date + timedelta(days=30)
+
+    if due_date <= issue_date:
+        raise ValueError("Due date must be after issue date")
+
+    data["issue_date"] = issue_date
+    data["due_date"] = due_date
+    return data
+
+
 class BookIssueRequest(BaseModel):
     book_id: int
     student_id: int
@@ -28,27 +50,12 @@ class BookIssueRequest(BaseModel):
     @model_validator(mode="before")
     @classmethod
     def set_dates(cls, data: dict):
-        # issue date
-        issue_date = data.get("issue_date")
-        if issue_date is None:
-            issue_date = date.today()
-
-        # due date
-        due_date = data.get("due_date")
-        if due_date is None:
-            due_date = issue_date + timedelta(days=30)
-
-        if due_date <= issue_date:
-            raise ValueError("Due date must be after issue date")
-
-        data["issue_date"] = issue_date
-        data["due_date"] = due_date
-        return data
+        return setIssueDates(data)
 
 
 class BookReturnRequest(BaseModel):
     issue_id: int
-    return_date: Optional[date] = None
+    return_date: Optional[date] = Field(None, validate_default=True)
 
     @field_validator("issue_id")
     @classmethod
@@ -68,6 +75,67 @@ class BookReturnRequest(BaseModel):
         return v
 
 
+class BookIssueBatchRequest(BaseModel):
+    student_id: int
+    book_ids: List[int]
+    issue_date: Optional[date] = None
+    due_date: Optional[date] = None
+
+    @field_validator("student_id")
+    @classmethod
+    def validate_student_id(cls, v):
+        if v is None or v <= 0:
+            raise ValueError("Student ID must be a positive integer")
+        return v
+
+    @field_validator("book_ids")
+    @classmethod
+    def validate_book_ids(cls, v):
+        if not v:
+            raise ValueError("Provide at least one book id")
+        if len(v) > MAX_BASKET_SIZE:
+            raise ValueError(f"Cannot issue more than {MAX_BASKET_SIZE} books at once")
+        if any(book_id <= 0 for book_id in v):
+            raise ValueError("Book IDs must be positive integers")
+        return v
+
+    @model_validator(mode="before")
+    @classmethod
+    def set_dates(cls, data: dict):
+        return setIssueDates(data)
+
+
+class BookReturnBatchRequest(BaseModel):
+    issue_ids: List[int]
+    return_date: Optional[date] = Field(None, validate_default=True)
+
+    @field_validator("issue_ids")
+    @classmethod
+    def validate_issue_ids(cls, v):
+        if not v:
+            raise ValueError("Provide at least one issue id")
+        if len(v) > MAX_BASKET_SIZE:
+            raise ValueError(f"Cannot return more than {MAX_BASKET_SIZE} books at once")
+        if any(issue_id <= 0 for issue_id in v):
+            raise ValueError("Issue IDs must be positive integers")
+        return v
+
+    @field_validator("return_date", mode="before")
+    @classmethod
+    def set_return_date(cls, v):
+        if v is None:
+            return date.today()
+
+        return v
+
+
+class BatchItemResult(BaseModel):
+    book_id: Optional[int] = None
+    issue_id: Optional[int] = None
+    status: str
+    detail: Optional[str] = None
+
+
 class BookIssueResponse(BaseModel):
     id: int
     book_id: int
@@ -82,12 +150,38 @@ class BookIssueResponse(BaseModel):
     model_config = {"from_attributes": True}
 
 
+class BookIssueRead(BaseModel):
+    id: int
+    book_id: int
+    student_id: int
+    issue_date: date
+    due_date: date
+    return_date: Optional[date]
+    created_at: datetime
+    updated_at: datetime
+
+    model_config = {"from_attributes": True}
+
+
 class IssuedBooksResponse(BaseModel):
     book: BookRead
     is_overdue: bool
 
 
+class LoanHistoryResponse(BaseModel):
+    issue_id: int
+    book: BookRead
+    issue_date: date
+    due_date: date
+    return_date: date
+    returned_late: bool
+
+
 class IssueReportResponse(BaseModel):
+    issue_id: int
+    issue_date: date
+    due_date: date
+    return_date: Optional[date]
     book: BookRead
     student: StudentRead
     is_overdue: bool
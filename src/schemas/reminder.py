@@ -25,3 +25,12 @@ class EmailConfig:
     sender_email: str = ""
     sender_password: str = ""
     sender_name: str = "Library Management Netenrich"
+    use_tls: bool = True
+    timeout: float = 30
+    # smtp sessions kept open and sending at once, and messages sent on one session
+    # before it is replaced
+    max_connections: int = 4
+    max_messages_per_connection: int = 100
+    # provider sending limit, messages per second with short bursts
+    rate_limit_per_second: float = 10
+    rate_limit_burst: int = 10
@@ -81,6 +81,7 @@ class StudentCreate(BaseModel):
 
 
 class StudentRead(BaseModel):
+    id: int
     name: str
     roll_number: str
     department: str
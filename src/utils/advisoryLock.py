@@ -0,0 +1,21 @@
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+
+# a postgres session level advisory lock, held on a dedicated connection for the whole
+# block. yields False straight away if another process holds it. if this process
+# dies the connection drops and postgres releases the lock by itself
+@asynccontextmanager
+async def advisoryLock(engine: AsyncEngine, name: str) -> AsyncIterator[bool]:
+    key = func.hashtext(name)
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        acquired = await conn.scalar(select(func.pg_try_advisory_lock(key)))
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                await conn.scalar(select(func.pg_advisory_unlock(key)))
@@ -0,0 +1,148 @@
+import csv
+import io
+import json
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import AsyncIterator, BinaryIO, Iterable, Iterator, List, Optional, Type
+
+from fastapi import UploadFile
+from pydantic import BaseModel, ValidationError
+from starlette.concurrency import run_in_threadpool
+
+SUPPORTED_FORMATS = ("csv", "ndjson")
+DEFAULT_BATCH_SIZE = 1000
+# the report keeps every counter but stops listing rows past this many errors
+MAX_REPORTED_ERRORS = 1000
+
+
+def detectFormat(filename: Optional[str], requested: Optional[str] = None) -> str:
+    if requested:
+        return requested
+    extension = (filename or "").rsplit(".", 1)[-1].lower()
+    if extension in ("ndjson", "jsonl"):
+        return "ndjson"
+    if extension == "csv":
+        return "csv"
+    raise ValueError("Unable to detect file format, pass format=csv or format=ndjson")
+
+
+# yields (row number, raw record) one row at a time, a record is an Exception if the row can't be parsed.
+# a csv header naming a column outside fields is rejected before any row is read
+def iterRecords(
+    file: BinaryIO, fmt: str, fields: Optional[Iterable[str]] = None
+) -> Iterator[tuple[int, object]]:
+    text_stream = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    fields = set(fields) if fields is not None else None
+
+    def unknownFields(names: Iterable) -> list:
+        return [name for name in names if fields is not None and name not in fields]
+
+    if fmt == "csv":
+        reader = csv.DictReader(text_stream)
+        unknown = unknownFields(reader.fieldnames or [])
+        if unknown:
+            raise ValueError(f"Unknown CSV columns: {', '.join(unknown)}")
+        for row_number, record in enumerate(reader, start=1):
+            # DictReader files values past the header under the None key
+            if None in record:
+                yield row_number, ValueError("Row has more values than the header")
+                continue
+            yield row_number, record
+        return
+
+    row_number = 0
+    for line in text_stream:
+        if not line.strip():
+            continue
+        row_number += 1
+        try:
+            record = json.loads(line)
+            if not isinstance(record, dict):
+                raise ValueError("Each line must be a JSON object")
+            unknown = unknownFields(record)
+            if unknown:
+                raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+            yield row_number, record
+        except ValueError as e:
+            yield row_number, e
+
+
+def formatRowErrors(row_number: int, error: Exception) -> dict:
+    if isinstance(error, ValidationError):
+        return {
+            "row": row_number,
+            "errors": [
+                {
+                    "field": ".".join(str(part) for part in detail["loc"]),
+                    "message": detail["msg"],
+                }
+                for detail in error.errors()
+            ],
+        }
+    return {"row": row_number, "errors": [{"field": None, "message": str(error)}]}
+
+
+# reads the upload batch by batch and validates every record against the given schema.
+# yields (valid rows as (row number, model), row errors, file error) per batch so only one
+# batch is in memory. a file that can't be read any further (bad encoding, broken csv
+# quoting) ends the stream with a file error on the last batch instead of raising, since
+# the batches before it may already be committed
+async def iterValidatedBatches(
+    upload: UploadFile,
+    fmt: str,
+    schema: Type[BaseModel],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> AsyncIterator[tuple[List[tuple[int, BaseModel]], List[dict], Optional[str]]]:
+    if fmt not in SUPPORTED_FORMATS:
+        raise ValueError(f"Unsupported format {fmt}, use csv or ndjson")
+
+    records = iterRecords(upload.file, fmt, schema.model_fields)
+    rows_read = 0
+
+    def nextBatch():
+        nonlocal rows_read
+        valid, errors, file_error = [], [], None
+        try:
+            for row_number, record in islice(records, batch_size):
+                rows_read = row_number
+                if isinstance(record, Exception):
+                    errors.append(formatRowErrors(row_number, record))
+                    continue
+                try:
+                    valid.append((row_number, schema.model_validate(record)))
+                except ValidationError as e:
+                    errors.append(formatRowErrors(row_number, e))
+        except UnicodeDecodeError:
+            file_error = f"File must be UTF-8 encoded, stopped reading after row {rows_read}"
+        except csv.Error as e:
+            file_error = f"Malformed CSV after row {rows_read}: {str(e)}"
+        return valid, errors, file_error
+
+    while True:
+        # file reads and validation are blocking, keep them off the event loop
+        valid, errors, file_error = await run_in_threadpool(nextBatch)
+        if not valid and not errors and not file_error:
+            break
+        yield valid, errors, file_error
+        if file_error:
+            break
+
+
+@dataclass
+class ImportReport:
+    rows_received: int = 0
+    rows_imported: int = 0
+    created: int = 0
+    updated: int = 0
+    rows_rejected: int = 0
+    errors: List[dict] = field(default_factory=list)
+    errors_truncated: bool = False
+    # set when the file stopped being readable part way, rows before it are still imported
+    file_error: Optional[str] = None
+
+    def reject(self, errors: List[dict]):
+        self.rows_rejected += len(errors)
+        room = MAX_REPORTED_ERRORS - len(self.errors)
+        if len(errors) > room:
+            self.errors_truncated = True
+        self.errors.extend(errors[: max(room, 0)])
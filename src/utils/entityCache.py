@@ -0,0 +1,88 @@
+from typing import Any, Optional
+
+from cachetools import TTLCache
+from sqlalchemy import inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
+
+from models.models import Book, Student
+
+# entries expire after ENTITY_CACHE_TTL seconds, which bounds how stale a worker can be
+# about writes made by other processes. writes in this process invalidate immediately
+ENTITY_CACHE_SIZE = 10000
+ENTITY_CACHE_TTL = 30
+
+
+class _CountingTTLCache(TTLCache):
+    def __init__(self, maxsize: int, ttl: float, owner: "EntityCache"):
+        super().__init__(maxsize=maxsize, ttl=ttl)
+        self.owner = owner
+
+    # only called when the cache is full
+    def popitem(self):
+        item = super().popitem()
+        self.owner.evictions += 1
+        return item
+
+    def expire(self, time=None):
+        expired = super().expire(time)
+        self.owner.expirations += len(expired)
+        return expired
+
+
+# LRU + TTL cache of column values keyed by primary key.
+# snapshots are cached rather than ORM instances, since an instance belongs to the session
+# that loaded it. a hit is merged into the caller's session without touching the database
+class EntityCache:
+    def __init__(
+        self,
+        model,
+        maxsize: int = ENTITY_CACHE_SIZE,
+        ttl: float = ENTITY_CACHE_TTL,
+    ):
+        self.model = model
+        self.columns = [attr.key for attr in inspect(model).column_attrs]
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._cache = _CountingTTLCache(maxsize, ttl, self)
+
+    async def get(self, db: AsyncSession, key: Any) -> Optional[Any]:
+        values = self._cache.get(key)
+        if values is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        instance = self.model(**values)
+        make_transient_to_detached(instance)
+        return await db.merge(instance, load=False)
+
+    def put(self, instance) -> None:
+        values = {column: getattr(instance, column) for column in self.columns}
+        self._cache[values["id"]] = values
+
+    def invalidate(self, *keys: Any) -> None:
+        for key in keys:
+            self._cache.pop(key, None)
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": self._cache.currsize,
+            "max_size": self._cache.maxsize,
+            "ttl_seconds": self._cache.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+bookCache = EntityCache(Book)
+studentCache = EntityCache(Student)
@@ -0,0 +1,35 @@
+import hashlib
+from datetime import datetime
+from typing import Iterable, Optional
+
+
+# rows written outside the app can have no updated_at, they get a fixed version until
+# the app first changes them
+def versionToken(updated_at: Optional[datetime]) -> str:
+    return "none" if updated_at is None else str(updated_at.timestamp())
+
+
+def bookEtag(book_id: int, updated_at: Optional[datetime]) -> str:
+    return f'W/"{book_id}-{versionToken(updated_at)}"'
+
+
+# weak etag for a list response, built from the query and the (id, updated_at) of every row
+def collectionEtag(query_parts: Iterable, rows: Iterable) -> str:
+    digest = hashlib.sha1()
+    for part in query_parts:
+        digest.update(f"{part}|".encode())
+    for row in rows:
+        digest.update(f"{row.id}:{versionToken(row.updated_at)};".encode())
+    return f'W/"{digest.hexdigest()}"'
+
+
+# weak comparison as used for If-None-Match, W/ prefixes are ignored
+def etagMatches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    if "*" in candidates:
+        return True
+    return etag.removeprefix("W/") in (
+        candidate.removeprefix("W/") for candidate in candidates
+    )
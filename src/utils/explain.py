@@ -0,0 +1,17 @@
+from typing import List
+
+from sqlalchemy import Select
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+
+# the plan postgres picks for a query, with its parameters inlined so the planner sees
+# the same values a request would send. analyze runs the query for real timings
+async def explainQuery(
+    conn: AsyncConnection, query: Select, analyze: bool = False
+) -> List[str]:
+    compiled = query.compile(
+        dialect=conn.dialect, compile_kwargs={"literal_binds": True}
+    )
+    options = "ANALYZE, BUFFERS" if analyze else "COSTS"
+    result = await conn.exec_driver_sql(f"EXPLAIN ({options}) {compiled}")
+    return [line for (line,) in result.all()]
@@ -0,0 +1,55 @@
+import base64
+import json
+from datetime import date
+from typing import Any, List
+
+from sqlalchemy import Select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+# cursors are opaque to clients, they only carry the sort key of the last row returned
+def encodeCursor(values: List[Any]) -> str:
+    payload = json.dumps(values, default=str, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+# types are the expected type of each value, in order. a date travels as its iso
+# string and is returned as a date. anything else is rejected as an invalid cursor so a
+# tampered token is a client error rather than a failing query
+def decodeCursor(token: str, *types: type) -> List[Any]:
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid pagination cursor")
+
+    if not isinstance(values, list) or len(values) != len(types):
+        raise ValueError("Invalid pagination cursor")
+
+    decoded = []
+    for value, expected in zip(values, types):
+        if expected is date:
+            try:
+                value = date.fromisoformat(value)
+            except (ValueError, TypeError):
+                raise ValueError("Invalid pagination cursor")
+        # exact type, a bool is not an id. ids also have to fit a bigint
+        elif type(value) is not expected or (
+            expected is int and not -(2**63) <= value < 2**63
+        ):
+            raise ValueError("Invalid pagination cursor")
+        decoded.append(value)
+    return decoded
+
+
+# planner row estimate for a query, costs the same no matter how many rows match
+async def estimateCount(db: AsyncSession, query: Select) -> int:
+    conn = await db.connection()
+    compiled = query.compile(
+        dialect=conn.dialect, compile_kwargs={"literal_binds": True}
+    )
+    result = await conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}")
+    plan = result.scalar_one()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
@@ -0,0 +1,86 @@
+from datetime import date
+from typing import Iterable, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.models import ReminderHistory
+
+REMINDER_TYPES = ("pre_due", "overdue")
+
+
+# the (book_issue_id, reminder_type) pairs already reminded on one day, packed into
+# single ints. only that day is ever held and the set stops growing at max_entries,
+# so memory is bounded by the ceiling rather than by ReminderHistory. once full,
+# unknown keys are answered "not seen" and the database anti join decides.
+# the database has the last word: every pass reloads the set from ReminderHistory,
+# so reminders released by another process are forgotten here too. keys claimed by
+# a pass still in flight are held apart in pending and survive the reload
+class ReminderDedupIndex:
+    def __init__(self, max_entries: int = 200_000):
+        self.max_entries = max_entries
+        self.day: Optional[date] = None
+        self.keys: set[int] = set()
+        self.pending: set[int] = set()
+        self.saturated = False
+
+    @staticmethod
+    def key(book_issue_id: int, reminder_type: str) -> int:
+        return book_issue_id * len(REMINDER_TYPES) + REMINDER_TYPES.index(reminder_type)
+
+    # a new day starts with an empty index, yesterday's keys can never match again
+    def rollover(self, today: date):
+        if self.day != today:
+            self.day = today
+            self.keys = set()
+            self.pending = set()
+            self.saturated = False
+
+    # replaces the settled keys with today's ReminderHistory rows
+    async def load(self, db: AsyncSession, today: date):
+        self.rollover(today)
+        self.keys = set()
+        self.saturated = False
+        result = await db.stream(
+            select(ReminderHistory.book_issue_id, ReminderHistory.reminder_type)
+            .where(ReminderHistory.sent_date == today)
+            .execution_options(yield_per=5000)
+        )
+        async for book_issue_id, reminder_type in result:
+            if reminder_type in REMINDER_TYPES:
+                self.add(self.key(book_issue_id, reminder_type))
+
+    def add(self, key: int):
+        if len(self.keys) >= self.max_entries:
+            self.saturated = True
+            return
+        self.keys.add(key)
+
+    # held until the pass commits (settle) or fails (discard)
+    def claim(self, book_issue_id: int, reminder_type: str) -> int:
+        key = self.key(book_issue_id, reminder_type)
+        self.pending.add(key)
+        return key
+
+    def settle(self, keys: Iterable[int]):
+        for key in keys:
+            self.pending.discard(key)
+            self.add(key)
+
+    def discard(self, keys: Iterable[int]):
+        keys = set(keys)
+        self.keys.difference_update(keys)
+        self.pending.difference_update(keys)
+
+    def contains(self, book_issue_id: int, reminder_type: str) -> bool:
+        key = self.key(book_issue_id, reminder_type)
+        return key in self.keys or key in self.pending
+
+    def stats(self) -> dict:
+        return {
+            "day": self.day,
+            "entries": len(self.keys),
+            "in_flight": len(self.pending),
+            "max_entries": self.max_entries,
+            "saturated": self.saturated,
+        }
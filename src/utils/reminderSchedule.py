@@ -0,0 +1,24 @@
+from datetime import date, timedelta
+
+# pre due reminders start this many days before the due date
+REMINDER_WINDOW_DAYS = 5
+# overdue loans are reminded on their first overdue day and then every this many days
+OVERDUE_CADENCE_DAYS = 7
+
+
+# the day a new loan gets its first reminder: when it enters the pre due window, or
+# at the next pass for a loan issued inside it
+def firstReminderOn(due_date: date) -> date:
+    return due_date - timedelta(days=REMINDER_WINDOW_DAYS)
+
+
+# the next reminder day of a loan reminded today: its due date, then its first
+# overdue day, then every cadence days while it stays overdue
+def nextReminderOn(
+    due_date: date, today: date, overdue_cadence_days: int = OVERDUE_CADENCE_DAYS
+) -> date:
+    if due_date > today:
+        return due_date
+    if due_date == today:
+        return today + timedelta(days=1)
+    return today + timedelta(days=overdue_cadence_days)
@@ -0,0 +1,65 @@
+from datetime import date
+from pathlib import Path
+
+from jinja2 import Environment, FileSystemLoader, StrictUndefined, select_autoescape
+
+TEMPLATE_DIR = Path(__file__).resolve().parent.parent / "templates" / "reminders"
+TEMPLATE_NAMES = ("pre_due", "overdue", "digest")
+
+
+def longdate(day: date) -> str:
+    return day.strftime("%B %d, %Y")
+
+
+# reminder emails rendered from templates/reminders. every template is compiled once,
+# when the registry is built, and sets its subject with {% set subject = ... %} next
+# to the html body. values are html escaped, so a book title cannot break the markup.
+# reload() picks up edited templates without a restart, reload_if_changed() only when
+# a template file changed since the last load
+class ReminderTemplates:
+    def __init__(self, directory: Path = TEMPLATE_DIR):
+        self.directory = directory
+        self.reload()
+
+    def file_mtimes(self) -> dict:
+        return {
+            name: (self.directory / f"{name}.html").stat().st_mtime_ns
+            for name in TEMPLATE_NAMES
+        }
+
+    def reload(self):
+        mtimes = self.file_mtimes()
+        environment = Environment(
+            loader=FileSystemLoader(self.directory),
+            autoescape=select_autoescape(["html"]),
+            undefined=StrictUndefined,
+            trim_blocks=True,
+            lstrip_blocks=True,
+            auto_reload=False,
+        )
+        environment.filters["longdate"] = longdate
+        # swapped in whole, a failed reload keeps the previous templates
+        self.templates = {
+            name: environment.get_template(f"{name}.html") for name in TEMPLATE_NAMES
+        }
+        self.mtimes = mtimes
+
+    # every process holds its own compiled templates, so each one checks the files
+    # before a reminder pass. a broken edit is reported once and the previous
+    # templates stay in use until the file changes again
+    def reload_if_changed(self) -> bool:
+        try:
+            mtimes = self.file_mtimes()
+            if mtimes == self.mtimes:
+                return False
+            self.mtimes = mtimes
+            self.reload()
+            return True
+        except Exception as e:
+            print(f"Keeping the previous reminder templates: {str(e)}")
+            return False
+
+    # returns (subject, body)
+    def render(self, name: str, context: dict) -> tuple[str, str]:
+        module = self.templates[name].make_module(context)
+        return str(module.subject).strip(), str(module)
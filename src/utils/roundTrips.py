@@ -0,0 +1,25 @@
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+
+from config.db import engine
+
+
+class RoundTripCounter:
+    def __init__(self):
+        self.count = 0
+
+
+# set per request by the middleware in main.py. it counts statements sent to the
+# database; BEGIN and COMMIT are issued by the driver itself and are not included
+currentRoundTrips: ContextVar[Optional[RoundTripCounter]] = ContextVar(
+    "currentRoundTrips", default=None
+)
+
+
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def countRoundTrip(conn, cursor, statement, parameters, context, executemany):
+    counter = currentRoundTrips.get()
+    if counter is not None:
+        counter.count += 1
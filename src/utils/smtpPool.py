@@ -0,0 +1,134 @@
+import asyncio
+import smtplib
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.message import Message
+
+from schemas.reminder import EmailConfig
+
+
+class PooledConnection:
+    def __init__(self, server: smtplib.SMTP):
+        self.server = server
+        self.messages_sent = 0
+
+
+# the server closed the session: a broken connection, or a 421 reply (service not
+# available, the usual answer to a session that sat idle too long)
+def sessionDropped(error: Exception) -> bool:
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code == 421
+    return isinstance(error, (smtplib.SMTPServerDisconnected, ConnectionError))
+
+
+# long lived, authenticated smtp sessions shared by concurrent senders. at most
+# max_connections are open (and sending) at once, each one is retired after
+# max_messages_per_connection messages, and a session the server dropped is replaced
+# and the message retried once. smtplib blocks, so every call runs on the pool's own
+# threads, one per connection
+class SMTPConnectionPool:
+    def __init__(self, config: EmailConfig):
+        self.config = config
+        self.idle: asyncio.Queue[PooledConnection] = asyncio.Queue()
+        self.slots = asyncio.Semaphore(config.max_connections)
+        self.executor = ThreadPoolExecutor(
+            max_workers=config.max_connections, thread_name_prefix="smtp"
+        )
+
+        self.messages_sent = 0
+        self.messages_failed = 0
+        self.connections_opened = 0
+        self.reconnects = 0
+        self.send_seconds = 0.0
+        self.started_at = time.monotonic()
+
+    def _connect(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(
+            self.config.smtp_server, self.config.smtp_port, timeout=self.config.timeout
+        )
+        if self.config.use_tls:
+            server.starttls()
+        if self.config.sender_password:
+            server.login(self.config.sender_email, self.config.sender_password)
+        return server
+
+    @staticmethod
+    def _close(server: smtplib.SMTP):
+        try:
+            server.quit()
+        except OSError:
+            server.close()
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
+
+    async def _open(self) -> PooledConnection:
+        connection = PooledConnection(await self._run(self._connect))
+        self.connections_opened += 1
+        return connection
+
+    async def _acquire(self) -> PooledConnection:
+        try:
+            return self.idle.get_nowait()
+        except asyncio.QueueEmpty:
+            return await self._open()
+
+    async def _release(self, connection: PooledConnection):
+        if connection.messages_sent >= self.config.max_messages_per_connection:
+            await self._run(self._close, connection.server)
+        else:
+            self.idle.put_nowait(connection)
+
+    async def send(self, message: Message):
+        async with self.slots:
+            started = time.monotonic()
+            connection = None
+            try:
+                connection = await self._acquire()
+                try:
+                    await self._run(connection.server.send_message, message)
+                except Exception as error:
+                    if not sessionDropped(error):
+                        raise
+                    # the server dropped the session, reconnect and retry once
+                    self.reconnects += 1
+                    connection.server.close()
+                    connection = None
+                    connection = await self._open()
+                    await self._run(connection.server.send_message, message)
+            except Exception:
+                self.messages_failed += 1
+                # the session may be mid transaction, never hand it out again
+                if connection is not None:
+                    await self._run(self._close, connection.server)
+                raise
+
+            connection.messages_sent += 1
+            self.messages_sent += 1
+            self.send_seconds += time.monotonic() - started
+            await self._release(connection)
+
+    async def close(self):
+        while not self.idle.empty():
+            connection = self.idle.get_nowait()
+            await self._run(self._close, connection.server)
+        self.executor.shutdown(wait=False)
+
+    def stats(self) -> dict:
+        elapsed = time.monotonic() - self.started_at
+        return {
+            "messages_sent": self.messages_sent,
+            "messages_failed": self.messages_failed,
+            "connections_opened": self.connections_opened,
+            "connections_idle": self.idle.qsize(),
+            "reconnects": self.reconnects,
+            "max_connections": self.config.max_connections,
+            "max_messages_per_connection": self.config.max_messages_per_connection,
+            "messages_per_second": round(self.messages_sent / elapsed, 2) if elapsed else 0.0,
+            "average_send_ms": (
+                round(self.send_seconds / self.messages_sent * 1000, 2)
+                if self.messages_sent
+                else None
+            ),
+        }
@@ -0,0 +1,77 @@
+import csv
+import io
+import json
+from datetime import datetime
+from typing import AsyncGenerator, List, Optional, Type
+
+from pydantic import BaseModel
+from sqlalchemy import Select
+
+from config.db import AsyncSessionLocal
+
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+EXPORT_CHUNK_SIZE = 1000
+EXPORT_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def encodeNdjson(rows: List[dict]) -> str:
+    return "".join(json.dumps(row) + "\n" for row in rows)
+
+
+def encodeCsv(rows: List[dict], fieldnames: List[str], header: bool = False) -> str:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fieldnames)
+    if header:
+        writer.writeheader()
+    writer.writerows(rows)
+    return buffer.getvalue()
+
+
+# timestamps are stored naive, in server local time. an updated_since with a utc
+# offset is converted to that before it reaches the query, comparing it as is would
+# fail inside the stream after the response has started
+def serverTime(value: Optional[datetime]) -> Optional[datetime]:
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone().replace(tzinfo=None)
+
+
+# a failed stream ends with one error line, so a client can tell a cut off export
+# from a complete one
+def encodeError(message: str, fmt: str) -> str:
+    if fmt == "csv":
+        return f"# error: {message}\n"
+    return json.dumps({"type": "error", "content": message}) + "\n"
+
+
+# streams a core (non ORM) select from a server side cursor, one chunk at a time,
+# so memory stays flat however many rows the query returns.
+# the request session is closed once the route returns, so the stream opens its own,
+# released as soon as the stream ends or the client goes away
+async def streamRows(
+    query: Select,
+    schema: Type[BaseModel],
+    fmt: str,
+    chunk_size: int = EXPORT_CHUNK_SIZE,
+) -> AsyncGenerator[str, None]:
+    fieldnames = list(schema.model_fields)
+
+    try:
+        async with AsyncSessionLocal() as db:
+            result = await db.stream(query.execution_options(yield_per=chunk_size))
+            header = True
+            async for partition in result.mappings().partitions():
+                rows = [
+                    schema.model_validate(dict(row)).model_dump(mode="json")
+                    for row in partition
+                ]
+                if fmt == "csv":
+                    yield encodeCsv(rows, fieldnames, header=header)
+                    header = False
+                else:
+                    yield encodeNdjson(rows)
+
+            if fmt == "csv" and header:
+                yield encodeCsv([], fieldnames, header=True)
+    except Exception as e:
+        yield encodeError(str(e), fmt)
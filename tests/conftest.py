@@ -0,0 +1,115 @@
+# the app imports its packages from src/. tests that need postgres run against the
+# database in TEST_DATABASE_URL (an asyncpg url, e.g.
+# postgresql+asyncpg://postgres@localhost:5432/library_test) and are skipped without
+# it. that database is wiped by every such test. tests are plain functions that run
+# their async body with asyncio.run, so the engine doesn't pool connections: none
+# outlives the event loop it was opened on
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from sqlalchemy import text  # noqa: E402
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine  # noqa: E402
+from sqlalchemy.pool import NullPool  # noqa: E402
+
+from models.models import Base  # noqa: E402
+
+
+@pytest.fixture
+def database_url() -> str:
+    url = os.environ.get("TEST_DATABASE_URL")
+    if not url:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    return url
+
+
+# fresh tables for one test. indexes that need pg_trgm are left out where the
+# extension is not installed, no test depends on them
+async def resetSchema(url: str):
+    engine = create_async_engine(url)
+    try:
+        async with engine.begin() as conn:
+            available = await conn.scalar(
+                text("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+            )
+            if available:
+                await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+
+            def create(sync_conn):
+                Base.metadata.drop_all(sync_conn)
+                skipped = []
+                if not available:
+                    for table in Base.metadata.sorted_tables:
+                        for index in list(table.indexes):
+                            if "trgm" in index.name:
+                                table.indexes.discard(index)
+                                skipped.append((table, index))
+                try:
+                    Base.metadata.create_all(sync_conn)
+                finally:
+                    for table, index in skipped:
+                        table.indexes.add(index)
+
+            await conn.run_sync(create)
+    finally:
+        await engine.dispose()
+
+
+@pytest.fixture
+def schema(database_url) -> str:
+    asyncio.run(resetSchema(database_url))
+    return database_url
+
+
+@pytest.fixture
+def engine(schema):
+    engine = create_async_engine(schema, poolclass=NullPool)
+    yield engine
+    asyncio.run(engine.dispose())
+
+
+@pytest.fixture
+def sessions(engine):
+    return async_sessionmaker(engine, expire_on_commit=False)
+
+
+# the db_session_factory the controllers take, one session per use
+@pytest.fixture
+def session_factory(sessions):
+    async def factory():
+        async with sessions() as db:
+            yield db
+
+    return factory
+
+
+async def seedLibrary(engine):
+    async with engine.begin() as conn:
+        await conn.execute(
+            text(
+                'INSERT INTO "Books" (id, title, isbn, number_of_copies, author, '
+                "category, created_at, updated_at) "
+                "SELECT g, 'Book ' || g, lpad(g::text, 13, '0'), 5, 'A', 'C', now(), now() "
+                "FROM generate_series(1, 5) g"
+            )
+        )
+        await conn.execute(
+            text(
+                'INSERT INTO "Students" (id, name, roll_number, department, semester, '
+                "phone, email) SELECT g, 'Student ' || g, 'R' || g, 'D', 1, "
+                "'98' || lpad(g::text, 8, '0'), 's' || g || '@example.com' "
+                "FROM generate_series(1, 5) g"
+            )
+        )
+
+
+# books 1 to 5 with five copies each, students 1 to 5
+@pytest.fixture
+def library(engine):
+    asyncio.run(seedLibrary(engine))
+    return engine
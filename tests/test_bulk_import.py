@@ -0,0 +1,60 @@
+import asyncio
+import io
+
+import pytest
+from fastapi import UploadFile
+
+from schemas.book import BookCreate
+from utils.bulkImport import iterValidatedBatches
+
+HEADER = b"title,isbn,number_of_copies,author,category\n"
+
+
+def row(n: int) -> bytes:
+    return f"Book {n},{n:013d},1,Author,Category\n".encode()
+
+
+def readBatches(content: bytes, fmt: str = "csv", batch_size: int = 2) -> list:
+    async def collect():
+        upload = UploadFile(io.BytesIO(content), filename=f"books.{fmt}")
+        return [
+            batch
+            async for batch in iterValidatedBatches(upload, fmt, BookCreate, batch_size)
+        ]
+
+    return asyncio.run(collect())
+
+
+def test_bad_encoding_part_way_ends_the_stream_with_a_file_error():
+    # far enough in that the reader has decoded whole batches before reaching it
+    content = HEADER + b"".join(row(n) for n in range(1, 601)) + b"Caf\xe9,1,1,A,C\n"
+    batches = readBatches(content, batch_size=100)
+
+    assert len(batches) > 1
+    assert all(file_error is None for _, _, file_error in batches[:-1])
+    assert batches[-1][2].startswith("File must be UTF-8 encoded")
+
+
+def test_unparseable_csv_ends_the_stream_with_a_file_error():
+    content = HEADER + row(1) + b'"' + b"x" * 200_000 + b'",0000000000002,1,A,C\n'
+    valid, errors, file_error = readBatches(content)[-1]
+
+    assert [row_number for row_number, _ in valid] == [1]
+    assert file_error.startswith("Malformed CSV after row 1")
+
+
+def test_unknown_csv_column_rejects_the_file():
+    with pytest.raises(ValueError, match="Unknown CSV columns: shelf"):
+        readBatches(HEADER.replace(b"\n", b",shelf\n") + row(1).replace(b"\n", b",A1\n"))
+
+
+def test_extra_values_and_unknown_ndjson_keys_are_row_errors():
+    _, errors, _ = readBatches(HEADER + row(1).replace(b"\n", b",extra\n"))[0]
+    assert errors[0]["errors"][0]["message"] == "Row has more values than the header"
+
+    line = (
+        b'{"title": "Book 1", "isbn": "0000000000001", "number_of_copies": 1, '
+        b'"author": "A", "category": "C", "shelf": "A1"}\n'
+    )
+    _, errors, _ = readBatches(line, fmt="ndjson")[0]
+    assert errors == [{"row": 1, "errors": [{"field": None, "message": "Unknown fields: shelf"}]}]
@@ -0,0 +1,33 @@
+import asyncio
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import text
+
+from controllers.bookController import BookController
+from utils.etag import bookEtag, collectionEtag, etagMatches
+
+Row = namedtuple("Row", "id updated_at")
+
+
+def test_null_updated_at_gets_a_fixed_version():
+    assert bookEtag(7, None) == 'W/"7-none"'
+    assert bookEtag(7, datetime(2026, 3, 10)) != bookEtag(7, None)
+    assert collectionEtag(["q"], [Row(7, None)]) == collectionEtag(["q"], [Row(7, None)])
+    assert etagMatches('"7-none"', bookEtag(7, None))
+
+
+async def bookVersions(engine, sessions) -> list:
+    async with engine.begin() as conn:
+        await conn.execute(
+            text(
+                'INSERT INTO "Books" (id, title, isbn, number_of_copies, author, '
+                "category) VALUES (1, 'Dune', '0000000000001', 5, 'A', 'C')"
+            )
+        )
+    async with sessions() as db:
+        return [await BookController.getBookVersion(db, book_id) for book_id in (1, 2)]
+
+
+def test_book_without_updated_at_still_exists(engine, sessions):
+    assert asyncio.run(bookVersions(engine, sessions)) == [(True, None), (False, None)]
@@ -0,0 +1,48 @@
+import asyncio
+from datetime import date
+
+from sqlalchemy import text
+
+from controllers.archiveController import ArchiveController
+from controllers.bookIssueController import BookIssueController
+
+
+async def historyAcrossArchive(engine, sessions):
+    async with engine.begin() as conn:
+        # loans 1 and 2 are old enough to be archived, 3 and 4 stay live
+        await conn.execute(
+            text(
+                'INSERT INTO "BookIssues" (id, book_id, student_id, issue_date, '
+                "due_date, return_date) VALUES "
+                "(1, 1, 1, '2019-01-01', '2019-01-15', '2019-01-10'), "
+                "(2, 1, 1, '2019-02-01', '2019-02-15', '2019-02-20'), "
+                "(3, 1, 1, '2025-01-01', '2025-01-15', '2025-01-10'), "
+                "(4, 1, 1, '2025-02-01', '2025-02-15', '2025-02-10')"
+            )
+        )
+
+    async with sessions() as db:
+        assert await ArchiveController.archiveReturnedLoans(db, date(2022, 1, 1)) == (2, 0)
+
+    async def pages(include_archive: bool) -> list:
+        seen, after = [], None
+        while True:
+            async with sessions() as db:
+                loans, after = await BookIssueController.getStudentLoanHistory(
+                    db, 1, limit=1, after=after, include_archive=include_archive
+                )
+            seen.append([(loan.issue_id, loan.returned_late) for loan in loans])
+            if after is None:
+                return seen
+
+    assert await pages(False) == [[(4, False)], [(3, False)]]
+    assert await pages(True) == [
+        [(4, False)],
+        [(3, False)],
+        [(2, True)],
+        [(1, False)],
+    ]
+
+
+def test_history_includes_archived_loans_on_request(library, sessions):
+    asyncio.run(historyAcrossArchive(library, sessions))
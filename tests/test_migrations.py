@@ -0,0 +1,136 @@
+import asyncio
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from controllers.bookIssueController import BookIssueController
+from migrations import createOpenLoanIndexes, scheduleOpenLoanReminders
+
+INDEX = "uq_BookIssues_open_loan"
+
+
+async def indexState(conn):
+    result = await conn.execute(
+        text(
+            "SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE c.relname = :name"
+        ),
+        {"name": INDEX},
+    )
+    return result.scalar_one_or_none()
+
+
+# a database from before the atomic checkout: no unique index yet, and two students
+# holding a book twice and three times
+async def seedDuplicates(engine):
+    today = date.today()
+    async with engine.begin() as conn:
+        await conn.execute(text(f'DROP INDEX "{INDEX}"'))
+        await conn.execute(
+            text(
+                'INSERT INTO "Books" (id, title, isbn, number_of_copies, author, category) '
+                "VALUES (1, 'One', '0000000000001', 0, 'A', 'C'), "
+                "(2, 'Two', '0000000000002', 0, 'A', 'C')"
+            )
+        )
+        await conn.execute(
+            text(
+                'INSERT INTO "Students" (id, name, roll_number, department, semester, '
+                "phone, email) VALUES "
+                "(1, 'S1', 'R1', 'D', 1, '9800000001', 's1@example.com'), "
+                "(2, 'S2', 'R2', 'D', 1, '9800000002', 's2@example.com')"
+            )
+        )
+        for issue_id, book_id, student_id in [(1, 1, 1), (2, 1, 1), (3, 2, 2), (4, 2, 2), (5, 2, 2), (6, 1, 2)]:
+            await conn.execute(
+                text(
+                    'INSERT INTO "BookIssues" (id, book_id, student_id, issue_date, due_date) '
+                    "VALUES (:id, :book_id, :student_id, :issue_date, :due_date)"
+                ),
+                {
+                    "id": issue_id,
+                    "book_id": book_id,
+                    "student_id": student_id,
+                    "issue_date": today,
+                    "due_date": today + timedelta(days=14),
+                },
+            )
+
+
+async def migrateOverDuplicates(engine):
+    await seedDuplicates(engine)
+
+    # the build a wedged run used to leave behind: an invalid unique index
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        with pytest.raises(Exception):
+            await conn.exec_driver_sql(
+                f'CREATE UNIQUE INDEX CONCURRENTLY "{INDEX}" ON "BookIssues" '
+                "(book_id, student_id) WHERE return_date IS NULL"
+            )
+        assert await indexState(conn) is False
+
+    # every rerun stops before building and names the duplicates
+    for _ in range(2):
+        with pytest.raises(ValueError) as error:
+            await createOpenLoanIndexes(engine)
+        assert "issues [1, 2]" in str(error.value)
+        assert "issues [3, 4, 5]" in str(error.value)
+
+    async with AsyncSession(engine) as db:
+        assert await BookIssueController.closeDuplicateOpenLoans(db) == [2, 4, 5]
+        assert await BookIssueController.closeDuplicateOpenLoans(db) == []
+
+    await createOpenLoanIndexes(engine)
+    async with engine.connect() as conn:
+        assert await indexState(conn) is True
+        open_loans = await conn.scalar(
+            text('SELECT count(*) FROM "BookIssues" WHERE return_date IS NULL')
+        )
+        copies = await conn.execute(
+            text('SELECT id, number_of_copies FROM "Books" ORDER BY id')
+        )
+        assert open_loans == 3
+        assert copies.all() == [(1, 1), (2, 2)]
+
+
+def test_open_loan_index_migration_over_duplicates(engine):
+    asyncio.run(migrateOverDuplicates(engine))
+
+
+# open loans from before the reminder schedule get their first reminder day, returned
+# ones stay unscheduled
+async def scheduleExistingLoans(engine):
+    today = date.today()
+    await seedDuplicates(engine)
+    async with engine.begin() as conn:
+        await conn.execute(text('ALTER TABLE "BookIssues" DROP COLUMN next_reminder_on'))
+        await conn.execute(
+            text('UPDATE "BookIssues" SET return_date = :today WHERE id = 6'),
+            {"today": today},
+        )
+
+    for _ in range(2):
+        await scheduleOpenLoanReminders(engine)
+
+    async with engine.connect() as conn:
+        result = await conn.execute(
+            text('SELECT id, next_reminder_on FROM "BookIssues" ORDER BY id')
+        )
+        schedule = dict(result.all())
+        index = await conn.scalar(
+            text(
+                "SELECT i.indisvalid FROM pg_index i "
+                "JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = :name"
+            ),
+            {"name": "ix_BookIssues_open_next_reminder_on"},
+        )
+    assert schedule.pop(6) is None
+    assert set(schedule.values()) == {today + timedelta(days=14 - 5)}
+    assert index is True
+
+
+def test_reminder_schedule_migration_backfills_open_loans(engine):
+    asyncio.run(scheduleExistingLoans(engine))
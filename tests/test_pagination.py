@@ -0,0 +1,34 @@
+from datetime import date
+
+import pytest
+
+from utils.pagination import decodeCursor, encodeCursor
+
+
+def test_round_trip_decodes_each_value_to_its_type():
+    token = encodeCursor([date(2026, 3, 10), 42])
+    assert decodeCursor(token, date, int) == [date(2026, 3, 10), 42]
+    assert decodeCursor(encodeCursor(["Dune", 7]), str, int) == ["Dune", 7]
+
+
+@pytest.mark.parametrize(
+    "values, types",
+    [
+        ([123, "x"], (date, int)),
+        (["2026-13-40", 1], (date, int)),
+        (["Dune", "7"], (str, int)),
+        (["Dune", 7.5], (str, int)),
+        ([True], (int,)),
+        ([2**63], (int,)),
+        ([None, 1], (str, int)),
+        (["Dune"], (str, int)),
+    ],
+)
+def test_values_of_the_wrong_type_are_an_invalid_cursor(values, types):
+    with pytest.raises(ValueError, match="Invalid pagination cursor"):
+        decodeCursor(encodeCursor(values), *types)
+
+
+def test_garbage_is_an_invalid_cursor():
+    with pytest.raises(ValueError, match="Invalid pagination cursor"):
+        decodeCursor("not a cursor!", int)
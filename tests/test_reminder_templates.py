@@ -0,0 +1,35 @@
+import os
+import shutil
+from datetime import date
+
+from utils.reminderTemplates import TEMPLATE_DIR, ReminderTemplates
+
+CONTEXT = {
+    "student_name": "Ada",
+    "book_title": "Dune",
+    "due_date": date(2026, 3, 15),
+    "days_remaining": 5,
+}
+
+
+def touch(path, content: str):
+    path.write_text(content)
+    mtime = path.stat().st_mtime_ns + 1_000_000_000
+    os.utime(path, ns=(mtime, mtime))
+
+
+def test_edited_templates_are_reloaded_by_modification_time(tmp_path):
+    directory = tmp_path / "reminders"
+    shutil.copytree(TEMPLATE_DIR, directory)
+    templates = ReminderTemplates(directory)
+    assert templates.reload_if_changed() is False
+
+    touch(directory / "pre_due.html", "{% set subject = 'Edited' %}{{ book_title }}")
+    assert templates.reload_if_changed() is True
+    assert templates.render("pre_due", CONTEXT) == ("Edited", "Dune")
+
+    # a broken edit keeps the previous templates and is not retried until edited again
+    touch(directory / "pre_due.html", "{% if %}")
+    assert templates.reload_if_changed() is False
+    assert templates.reload_if_changed() is False
+    assert templates.render("pre_due", CONTEXT) == ("Edited", "Dune")
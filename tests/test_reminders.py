@@ -0,0 +1,229 @@
+import asyncio
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import delete, func, select, update
+
+import controllers.overdueTrackingController as overdue
+from controllers.bookIssueController import BookIssueController
+from models.models import BookIssue, EmailOutbox, ReminderHistory
+from schemas.reminder import EmailConfig
+from schemas.bookIssue import BookIssueRequest
+from utils.reminderSchedule import firstReminderOn, nextReminderOn
+
+TODAY = date(2026, 3, 10)
+
+
+def days(n: int) -> date:
+    return TODAY + timedelta(days=n)
+
+
+def test_first_reminder_when_entering_the_pre_due_window():
+    assert firstReminderOn(days(30)) == days(25)
+    # issued inside the window: already due, the next pass picks it up
+    assert firstReminderOn(days(2)) <= TODAY
+
+
+def test_next_reminder_goes_due_date_then_first_overdue_day_then_cadence():
+    assert nextReminderOn(days(5), TODAY, 7) == days(5)
+    assert nextReminderOn(days(1), TODAY, 7) == days(1)
+    assert nextReminderOn(TODAY, TODAY, 7) == days(1)
+    assert nextReminderOn(days(-1), TODAY, 7) == days(7)
+    assert nextReminderOn(days(-30), TODAY, 3) == days(3)
+
+
+class FakeDate(date):
+    current = TODAY
+
+    @classmethod
+    def today(cls):
+        return cls.current
+
+
+# the reminder passes see FakeDate.current as today, TODAY unless a test moves it
+@pytest.fixture
+def clock(monkeypatch):
+    monkeypatch.setattr(overdue, "date", FakeDate)
+    FakeDate.current = TODAY
+    return FakeDate
+
+
+async def issue(
+    sessions, book_id: int, student_id: int, due_date: date, issue_date: date = days(-20)
+) -> int:
+    async with sessions() as db:
+        loan = await BookIssueController.issueBook(
+            db,
+            BookIssueRequest(
+                book_id=book_id,
+                student_id=student_id,
+                issue_date=issue_date,
+                due_date=due_date,
+            ),
+        )
+        return loan.id
+
+
+async def scheduledPasses(sessions, session_factory):
+    tracking = overdue.OverdueTrackingController(
+        None, session_factory, incremental=True, overdue_cadence_days=7
+    )
+
+    # the reminders one pass on the given day recorded, by loan
+    async def run(day: int) -> dict:
+        async with sessions() as db:
+            last_id = await db.scalar(select(func.max(ReminderHistory.id))) or 0
+        FakeDate.current = days(day)
+        await tracking.process_reminders()
+        async with sessions() as db:
+            result = await db.execute(
+                select(ReminderHistory.book_issue_id, ReminderHistory.reminder_type)
+                .where(ReminderHistory.id > last_id)
+                .order_by(ReminderHistory.id)
+            )
+            return {loans[issue_id]: kind for issue_id, kind in result.all()}
+
+    loans = {
+        await issue(sessions, 1, 1, days(5)): "enters window today",
+        await issue(sessions, 2, 2, days(3)): "inside window",
+        await issue(sessions, 3, 3, days(-1)): "one day overdue",
+        await issue(sessions, 4, 4, days(1)): "due tomorrow",
+    }
+
+    assert await run(0) == {
+        "enters window today": "pre_due",
+        "inside window": "pre_due",
+        "one day overdue": "overdue",
+        "due tomorrow": "pre_due",
+    }
+
+    # issued after the pass on the same day, straight into the window
+    loans[await issue(sessions, 5, 5, days(2), issue_date=TODAY)] = "issued after the pass"
+    assert await run(0) == {"issued after the pass": "pre_due"}
+    # no days since the last pass, nothing new
+    assert await run(0) == {}
+
+    # one day later: the due date reminder ("0 days remaining")
+    assert await run(1) == {"due tomorrow": "pre_due"}
+    # it turned overdue between passes
+    assert await run(2) == {
+        "due tomorrow": "overdue",
+        "issued after the pass": "pre_due",
+    }
+    # more days than the cadence: every loan is overdue and reminded once
+    assert await run(12) == {
+        "enters window today": "overdue",
+        "inside window": "overdue",
+        "one day overdue": "overdue",
+        "due tomorrow": "overdue",
+        "issued after the pass": "overdue",
+    }
+    assert await run(13) == {}
+    assert await run(19) == dict.fromkeys(loans.values(), "overdue")
+
+
+def test_scheduled_passes(library, sessions, session_factory, clock):
+    asyncio.run(scheduledPasses(sessions, session_factory))
+
+
+async def deadLetteredDigest(engine, sessions, session_factory):
+    # nothing listens on port 1, every delivery fails straight away
+    email = overdue.EmailController(
+        EmailConfig(smtp_server="127.0.0.1", smtp_port=1, timeout=1)
+    )
+    tracking = overdue.OverdueTrackingController(
+        None, session_factory, digest=True, incremental=True
+    )
+    outbox = overdue.EmailOutboxController(
+        email, session_factory, reminder_index=tracking.sent_today
+    )
+
+    async def history() -> list:
+        async with sessions() as db:
+            result = await db.execute(
+                select(ReminderHistory.book_issue_id, ReminderHistory.email_outbox_id)
+                .order_by(ReminderHistory.book_issue_id)
+            )
+            return result.all()
+
+    try:
+        for book_id in (1, 2):
+            await issue(sessions, book_id, 1, days(-1))
+
+        await tracking.process_reminders()
+        async with sessions() as db:
+            (first_email,) = (await db.execute(select(EmailOutbox.id))).scalars().all()
+        # one digest carries both reminders
+        assert [row.email_outbox_id for row in await history()] == [first_email] * 2
+
+        async with engine.begin() as conn:
+            await conn.execute(
+                update(EmailOutbox).values(attempts=overdue.OUTBOX_MAX_ATTEMPTS - 1)
+            )
+        assert (await outbox.dispatch())["dead"] == 1
+
+        # released: no history left and both loans due again today
+        assert await history() == []
+        async with sessions() as db:
+            result = await db.execute(select(BookIssue.next_reminder_on))
+            assert result.scalars().all() == [TODAY, TODAY]
+
+        # the same process passes again the same day
+        result = await tracking.process_reminders()
+        assert result["reminders"] == 2
+        assert {row.email_outbox_id for row in await history()} - {first_email}
+    finally:
+        await email.close()
+
+
+def test_dead_lettered_reminders_are_released(library, sessions, session_factory, clock):
+    asyncio.run(deadLetteredDigest(library, sessions, session_factory))
+
+
+async def studentFillingAChunk(sessions, session_factory):
+    tracking = overdue.OverdueTrackingController(None, session_factory, digest=True)
+
+    # student 1 alone has more reminders than a chunk holds, student 2 follows
+    for book_id, student_id in ((1, 1), (2, 1), (3, 1), (4, 2)):
+        await issue(sessions, book_id, student_id, days(-1))
+
+    result = await tracking.process_reminders()
+    assert (result["reminders"], result["emails_queued"]) == (4, 2)
+    async with sessions() as db:
+        result = await db.execute(
+            select(ReminderHistory.student_id, func.count(EmailOutbox.id.distinct()))
+            .join(EmailOutbox, EmailOutbox.id == ReminderHistory.email_outbox_id)
+            .group_by(ReminderHistory.student_id)
+            .order_by(ReminderHistory.student_id)
+        )
+        # one digest each
+        assert result.all() == [(1, 1), (2, 1)]
+
+
+def test_student_with_more_reminders_than_a_chunk_gets_one_digest(
+    library, sessions, session_factory, clock, monkeypatch
+):
+    monkeypatch.setattr(overdue, "REMINDER_CHUNK_SIZE", 2)
+    asyncio.run(studentFillingAChunk(sessions, session_factory))
+
+
+async def releasedElsewhere(engine, sessions, session_factory):
+    tracking = overdue.OverdueTrackingController(None, session_factory, incremental=True)
+
+    await issue(sessions, 1, 1, days(-1))
+    await tracking.init()
+    assert (await tracking.process_reminders())["reminders"] == 1
+    assert (await tracking.process_reminders())["reminders"] == 0
+
+    # the dispatcher of another process dead letters the email and releases it
+    async with engine.begin() as conn:
+        await conn.execute(delete(ReminderHistory))
+        await conn.execute(update(BookIssue).values(next_reminder_on=TODAY))
+
+    assert (await tracking.process_reminders())["reminders"] == 1
+
+
+def test_reminders_released_by_another_process_are_sent_again(
+    library, sessions, session_factory, clock
+):
+    asyncio.run(releasedElsewhere(library, sessions, session_factory))
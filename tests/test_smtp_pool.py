@@ -0,0 +1,58 @@
+import asyncio
+
+import pytest
+
+from benchmarks.emailDelivery import BENCH_HOST, SinkSMTPServer
+from controllers.overdueTrackingController import EmailController
+from schemas.reminder import EmailConfig
+
+
+async def deliverThroughDrops(announce: bool) -> tuple:
+    sink = SinkSMTPServer(latency=0)
+    port = await sink.start()
+    email_service = EmailController(
+        EmailConfig(
+            smtp_server=BENCH_HOST,
+            smtp_port=port,
+            sender_email="library@example.invalid",
+            use_tls=False,
+            timeout=5,
+            max_connections=2,
+        )
+    )
+    pool = email_service.pool
+
+    async def sendAll(count: int):
+        await asyncio.gather(
+            *[
+                pool.send(
+                    email_service.createMessage(
+                        f"student{i}@example.invalid", "Test", "<p>test</p>"
+                    )
+                )
+                for i in range(count)
+            ]
+        )
+
+    try:
+        await sendAll(20)
+        # twenty messages over at most two sessions
+        assert (sink.messages, pool.connections_opened, sink.sessions) == (20, 2, 2)
+
+        sink.drop(announce)
+        # let the closed sessions reach the idle connections
+        await asyncio.sleep(0.1)
+        await sendAll(2)
+        return sink.messages, pool.stats()
+    finally:
+        await email_service.close()
+        await sink.stop()
+
+
+@pytest.mark.parametrize("announce", [False, True], ids=["closed", "421"])
+def test_pool_reuses_sessions_and_reconnects_after_the_server_drops_them(announce):
+    messages, stats = asyncio.run(deliverThroughDrops(announce))
+
+    assert messages == 22
+    assert (stats["reconnects"], stats["connections_opened"]) == (2, 4)
+    assert stats["messages_failed"] == 0
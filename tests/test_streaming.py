@@ -0,0 +1,35 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import text
+
+import utils.streaming as streaming
+from controllers.bookController import BookController
+from schemas.book import BookRead
+from utils.streaming import serverTime
+
+
+def test_server_time_converts_offsets_to_naive_local_time():
+    naive = datetime(2026, 3, 10, 12, 0)
+    assert serverTime(naive) is naive
+    assert serverTime(None) is None
+
+    aware = datetime(2026, 3, 10, 12, 0, tzinfo=timezone(timedelta(hours=5, minutes=30)))
+    converted = serverTime(aware)
+    assert converted.tzinfo is None
+    assert converted == aware.astimezone().replace(tzinfo=None)
+
+
+async def exportLines(query) -> list:
+    return [chunk async for chunk in streaming.streamRows(query, BookRead, "ndjson")]
+
+
+def test_export_with_an_offset_and_a_failing_export(sessions, monkeypatch):
+    monkeypatch.setattr(streaming, "AsyncSessionLocal", sessions)
+    since = serverTime(datetime.now(timezone.utc) - timedelta(days=1))
+    assert asyncio.run(exportLines(BookController.exportQuery(since))) == []
+
+    # the stream ends with an error line instead of just stopping
+    failing = BookController.exportQuery().where(text('1 / 0 = 1 OR "Books".id > 0'))
+    lines = asyncio.run(exportLines(failing))
+    assert lines[-1].startswith('{"type": "error"')
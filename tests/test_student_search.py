@@ -0,0 +1,13 @@
+import pytest
+
+from controllers.studentController import StudentController
+
+
+def test_phone_filter_without_digits_is_rejected():
+    with pytest.raises(ValueError, match="at least one digit"):
+        StudentController.searchQuery(phone="abc")
+
+
+def test_phone_filter_matches_on_the_digits():
+    query = StudentController.searchQuery(phone="+91 98-")
+    assert query.compile().params["phone_1"] == "9198"